@@ -0,0 +1,144 @@
+"""
+Time of /brainfuck on classic programs: the interpreter it replaced and the compiled one.
+
+Run from the repo folder: python benchmarks/bench_brainfuck.py
+"""
+import datetime
+import os
+import string
+import sys
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.spam.brainfuck import interpret  # noqa: E402
+
+
+PROGRAMS = {
+    "hello world": (
+        "++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<.+++.------."
+        "--------.>>+.>++."
+    ),
+    "cell size": (
+        "++++++++[>++++++++<-]>[<++++>-]+<[>-<[>++++<-]>[<++++++++>-]<[>++++++++<-]+>[>++++++++++"
+        "[>+++++<-]>+.-.[-]<<[-]<->]<[>>+++++++[>+++++++<-]>.+++++.[-]<<<-]]>[>++++++++[>+++++++<-"
+        "]>.[-]<<-]<+++++++++++[>+++>+++++++++>+++++++++>+<<<<-]>-.>-.+++++++.+++++++++++.<.>>.++."
+        "+++++++..<-.>>-[[-]<]"
+    ),
+    "sierpinski": (
+        "++++++++[>+>++++<<-]>++>>+<[-[>>+<<-]+>>]>+[-<<<[->[+[-]+>++>>>-<<]<[<]>>++++++[<<+++++>>"
+        "-]+<<++.[-]<<]>.>+[>>]>+]"
+    ),
+    "squares": (
+        "++++[>+++++<-]>[<+++++>-]+<+[>[>+>+<<-]++>>[<<+>>-]>>>[-]++>[-]+>>>+[[-]++++++>>>]<<<[[<+"
+        "+++++++<++>>-]+<.<[>----<-]<]<<[>>>>>[>>>[-]+++++++++<[>-<-]+++++++++>[-[<->-]+[<<<]]<[>+"
+        "<-]>]<<-]<<-]"
+    ),
+    "nested loops": "++++++++[>++++++++[>++++++++[>++++++++[>+<-]<-]<-]<-]>>>>.",
+}
+
+
+def old_interpret(instr, inputs=None, seconds=1):
+    """
+    Text.brainfuck before, returning what it replied.
+    """
+    max_cell_value = 255
+    do_wrapping = True
+    inputs = list(inputs) if inputs else None
+
+    data, data_ptr, instr_ptr = [0], 0, 0
+    result = ""
+
+    time_start = datetime.datetime.now()
+    while instr_ptr < len(instr):
+        command = instr[instr_ptr]
+
+        if command == ">":
+            data_ptr += 1
+            if data_ptr == len(data):
+                data.append(0)
+        elif command == "<":
+            data_ptr -= 1
+            if data_ptr < 0:
+                data_ptr = 0
+        elif command == "+":
+            data[data_ptr] += 1
+            if data[data_ptr] > max_cell_value:
+                if do_wrapping:
+                    data[data_ptr] = 0
+                else:
+                    data[data_ptr] = max_cell_value
+        elif command == "-":
+            data[data_ptr] -= 1
+            if data[data_ptr] < 0:
+                if do_wrapping:
+                    data[data_ptr] = max_cell_value
+                else:
+                    data[data_ptr] = 0
+        elif command == ".":
+            if chr(data[data_ptr]) not in string.printable:  # Gross flemme
+                result += " "
+            else:
+                result += chr(data[data_ptr])
+        elif command == ",":
+            if inputs:
+                data[data_ptr] = ord(inputs.pop(0))
+            else:
+                instr_ptr += 1
+                data[data_ptr] = ord(instr[instr_ptr])
+        elif command == "[":
+            if data[data_ptr] == 0:
+                braces = 1
+                while braces > 0:
+                    instr_ptr += 1
+                    if instr[instr_ptr] == "[":
+                        braces += 1
+                    elif instr[instr_ptr] == "]":
+                        braces -= 1
+        elif command == "]":
+            braces = 1
+            while braces > 0:
+                instr_ptr -= 1
+                if instr[instr_ptr] == "[":
+                    braces -= 1
+                elif instr[instr_ptr] == "]":
+                    braces += 1
+            instr_ptr -= 1
+        else:
+            return f"Error at position {instr_ptr}: unexpected {command}."
+
+        instr_ptr += 1
+        if datetime.datetime.now() - time_start > datetime.timedelta(seconds=seconds):
+            return f"This is taking too much time :/"
+
+    return f"Interpreted: {result}"
+
+
+def timed(function, *args):
+    """
+    :return: (result, milliseconds of the best of 3 runs)
+    """
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return result, min(times)
+
+
+if __name__ == "__main__":
+    for name, code in PROGRAMS.items():
+        # Without the 1 second limit of the old interpreter, to see how long it would have taken
+        old, old_time = timed(old_interpret, code, None, 3600)
+        new, new_time = timed(interpret, code, None, 10 ** 9)
+        assert old == new, (name, old, new)
+        print(
+            "{:<14} old {:>10.1f} ms  new {:>8.1f} ms  x{:<6.0f} {}".format(
+                name,
+                old_time,
+                new_time,
+                old_time / new_time,
+                "(over 1 s before)" * (old_time > 1000),
+            )
+        )
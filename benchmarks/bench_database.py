@@ -0,0 +1,134 @@
+"""
+Concurrent reads and writes on the users table, with the default SQLite database the bot used to
+create and with the one from make_database (WAL, pragmas, connection pool).
+
+Run from the repo folder: python benchmarks/bench_database.py [seconds]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+
+from peewee import BigIntegerField, CharField, IntegerField, Model, OperationalError, SqliteDatabase
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.database import make_database  # noqa: E402
+
+
+USERS = 50_000
+CHATS = 50
+CONFIGURATIONS = ((2, 8), (4, 4), (8, 2))  # (writers, readers)
+
+
+class User(Model):
+    userid = BigIntegerField()
+    userfirstname = CharField(null=True)
+    chatid = BigIntegerField()
+    karma = IntegerField(default=0)
+    num_messages = IntegerField(default=0)
+    level = IntegerField(default=0)
+
+    class Meta:
+        indexes = (
+            (("userid", "chatid"), True),
+            (("chatid", "karma", "userid", "userfirstname"), False),
+        )
+
+
+def fill(database):
+    User.bind(database)
+    database.create_tables([User])
+    with database.atomic():
+        database.cursor().executemany(
+            'INSERT INTO "user" (userid, userfirstname, chatid, karma, num_messages, level) '
+            "VALUES (?, ?, ?, ?, 0, 0)",
+            ((i, "user{}".format(i), i % CHATS, i % 97) for i in range(USERS)),
+        )
+
+
+def write(rng):
+    userid = rng.randrange(USERS)
+    with User._meta.database.atomic():
+        User.update(num_messages=User.num_messages + 1, karma=User.karma + 1).where(
+            (User.userid == userid) & (User.chatid == userid % CHATS)
+        ).execute()
+
+
+def read(rng):
+    list(
+        User.select(User.userid, User.userfirstname, User.karma)
+        .where(User.chatid == rng.randrange(CHATS))
+        .order_by(User.karma.desc())
+        .limit(10)
+        .tuples()
+    )
+
+
+def worker(function, seed, deadline, results):
+    rng = random.Random(seed)
+    times, errors = [], 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            function(rng)
+        except OperationalError:  # database is locked
+            errors += 1
+            continue
+        times.append(time.perf_counter() - start)
+    User._meta.database.close()
+    results.append((function.__name__, times, errors))
+
+
+def run(name, make, writers, readers, seconds):
+    with tempfile.TemporaryDirectory() as folder:
+        database = make(os.path.join(folder, "main.db"))
+        fill(database)
+        database.close()
+
+        results = []
+        deadline = time.monotonic() + seconds
+        threads = [
+            threading.Thread(target=worker, args=(function, i, deadline, results))
+            for i, function in enumerate([write] * writers + [read] * readers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if hasattr(database, "close_all"):
+            database.close_all()
+
+    for kind in ("write", "read"):
+        times = sorted(t for function, ts, _ in results if function == kind for t in ts)
+        errors = sum(e for function, _, e in results if function == kind)
+        print(
+            "{:<14} {}w/{}r  {:<5} {:>8.0f} ops/s  p50 {:>7.2f} ms  p99 {:>8.2f} ms  "
+            "{} locked".format(
+                name,
+                writers,
+                readers,
+                kind,
+                len(times) / seconds,
+                times[len(times) // 2] * 1000 if times else 0,
+                times[int(len(times) * 0.99)] * 1000 if times else 0,
+                errors,
+            )
+        )
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for writers, readers in CONFIGURATIONS:
+        run("default", SqliteDatabase, writers, readers, seconds)
+        run(
+            "make_database",
+            lambda path: make_database("sqlite+pool:///" + path),
+            writers,
+            readers,
+            seconds,
+        )
@@ -0,0 +1,121 @@
+"""
+Time of the generative images: the per-pixel loops they replaced and the NumPy versions.
+
+Run from the repo folder: python benchmarks/bench_generative.py
+"""
+import os
+import random
+import sys
+import timeit
+
+
+from PIL import Image
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.spam import generative  # noqa: E402
+
+
+USERID = 123456789
+SIZES = (8, 32, 128, 512)
+
+
+def old_nft(userid):
+    """
+    Media.nft before, without the saving.
+    """
+    binuserid = bin(userid)[2:].zfill(64)
+
+    vroumbot = "vroumbot"
+    binvroumbot = "".join(format(ord(x), "b").zfill(8) for x in vroumbot)
+
+    img = Image.new("RGBA", (64, 64), "black")
+    pixels = img.load()
+
+    def magic(i, j, userid):
+        ij = i * j
+        iju = i * j * userid
+        pix1 = hash(vroumbot[iju % len(vroumbot)] + str(iju)) % 256
+        pix2 = hash(vroumbot[iju % len(vroumbot)] + str(ij)) % 256
+        pix3 = hash(vroumbot[ij % len(vroumbot)] + str(iju)) % 256
+        transp = 255
+
+        if pix1 == pix2 == pix3:
+            transp = 0
+
+        return (pix1, pix2, pix3, transp)
+
+    for i in range(img.size[0]):
+        for j in range(img.size[1]):
+            pixels[i, j] = magic(i, j, userid)
+
+    for i, p in enumerate(binuserid):
+        if p == "1":
+            pixels[i, 0] = (0, 0, 0, 255)
+        else:
+            pixels[i, 0] = (0, 0, 0, 0)
+
+    for j, p in enumerate(binvroumbot):
+        if p == "1":
+            pixels[0, j] = (0, 0, 0, 255)
+        else:
+            pixels[0, j] = (0, 0, 0, 0)
+
+    return img.resize((512, 512), Image.NEAREST)
+
+
+def old_randompic(userid, img_size):
+    """
+    Media.randompic before, without the saving.
+    """
+    random.seed(userid)
+    r_color = lambda: (  # noqa: E731
+        random.randint(0, 255),
+        random.randint(0, 255),
+        random.randint(0, 255),
+        int(255),
+    )
+    black = (0, 0, 0, 255)
+
+    colors = [r_color(), r_color(), r_color(), black, black, black]
+
+    img = Image.new("RGBA", (img_size, img_size), "black")
+
+    pixels = img.load()
+
+    for i in range(2, img.size[0] // 2):
+        for j in range(2, img.size[1] - 2):
+            c = random.choice(colors)
+            pixels[i, j] = c
+            pixels[img.size[0] - i - 1, j] = c
+
+    return img.resize((512, 512), Image.NEAREST)
+
+
+def best(function, *args):
+    """
+    :return: Milliseconds, best of a few runs.
+    """
+    timer = timeit.Timer(lambda: function(*args))
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1000
+
+
+def report(name, old, new):
+    print("{:<18} old {:>9.2f} ms  new {:>7.2f} ms  x{:.0f}".format(name, old, new, old / new))
+
+
+if __name__ == "__main__":
+    report("nft", best(old_nft, USERID), best(generative.nft, USERID))
+    for size in SIZES:
+        report(
+            "randompic {}".format(size),
+            best(old_randompic, USERID, size),
+            best(generative.generative, USERID, size),
+        )
+    print(
+        "PNG encoding: nft {:.2f} ms, generative 512 {:.2f} ms".format(
+            best(generative.nft_png, USERID), best(generative.generative_png, USERID, 512)
+        )
+    )
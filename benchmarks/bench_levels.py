@@ -0,0 +1,83 @@
+"""
+Time of the level computation: the needed_exp loop it replaced, get_level, and get_levels.
+
+Run from the repo folder: python benchmarks/bench_levels.py [users]
+"""
+import os
+import random
+import sys
+import time
+
+
+import numpy as np
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.community.levels import get_level, get_levels  # noqa: E402
+
+
+def old_needed_exp(level, karma):
+    if level == 0:
+        return 0
+    # Dirty hack
+    if level == 1:
+        return 5
+    return int((level ** 3.14) * (1 - (karma / (level ** 3.14))))
+
+
+def old_level(num_messages, karma, level=0):
+    while num_messages > old_needed_exp(level, karma):
+        level += 1
+    return level
+
+
+def timed(name, function, users):
+    start = time.perf_counter()
+    levels = function()
+    elapsed = time.perf_counter() - start
+    print("{:<28} {:>9.3f} s  {:>8.2f} us/user".format(name, elapsed, elapsed / users * 1e6))
+    return list(levels)
+
+
+def run(users, most):
+    rng = random.Random(0)
+    num_messages = [rng.randint(0, most) for _ in range(users)]
+    karma = [rng.randint(-20, 200) for _ in range(users)]
+    array_messages, array_karma = np.array(num_messages), np.array(karma)
+
+    print("{} users, up to {} messages (level {})".format(users, most, old_level(most, 0)))
+    expected = timed(
+        "needed_exp loop", lambda: [old_level(n, k) for n, k in zip(num_messages, karma)], users
+    )
+    assert (
+        timed("get_level", lambda: [get_level(n, k) for n, k in zip(num_messages, karma)], users)
+        == expected
+    )
+    assert timed("get_levels", lambda: get_levels(array_messages, array_karma), users) == expected
+    print()
+
+
+def run_message(users, most):
+    """
+    One more message from users already at their level, as in add_message.
+    """
+    rng = random.Random(1)
+    num_messages = [rng.randint(0, most) for _ in range(users)]
+    karma = [rng.randint(-20, 200) for _ in range(users)]
+    levels = [get_level(n, k) for n, k in zip(num_messages, karma)]
+    users_levels = list(zip([n + 1 for n in num_messages], karma, levels))
+
+    print("{} users, one more message, up to {} messages".format(users, most))
+    expected = timed("needed_exp loop", lambda: [old_level(*user) for user in users_levels], users)
+    assert (
+        timed("get_level", lambda: [get_level(*user) for user in users_levels], users) == expected
+    )
+    print()
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    for most in (500, 50_000, 10 ** 7):  # Active users, imported histories, extremes
+        run(users, most)
+    run_message(users, 50_000)
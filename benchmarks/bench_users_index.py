@@ -0,0 +1,132 @@
+"""
+Latency of the user lookups and leaderboards, without and with the indexes of the users table.
+
+Run from the repo folder: python benchmarks/bench_users_index.py [rows ...]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+from peewee import BigIntegerField, CharField, IntegerField, Model, SqliteDatabase
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.community.helpers import get_user  # noqa: E402
+
+
+SIZES = (10_000, 100_000, 1_000_000)
+CHATS = 100
+
+
+def old_get_user(table, userid, chatid):
+    """
+    get_user before the indexes.
+    """
+    user, _ = table.get_or_create(userid=userid, chatid=chatid)
+    return user
+
+
+def make_table(database, indexed):
+    class User(Model):
+        userid = BigIntegerField()
+        userfirstname = CharField(null=True)
+        chatid = BigIntegerField()
+        karma = IntegerField(default=0)
+        num_messages = IntegerField(default=0)
+        level = IntegerField(default=0)
+
+        class Meta:
+            table_name = "user"
+            indexes = (
+                (
+                    (("userid", "chatid"), True),
+                    (("chatid", "karma", "userid", "userfirstname"), False),
+                    (
+                        ("chatid", "level", "num_messages", "userid", "userfirstname", "karma"),
+                        False,
+                    ),
+                )
+                if indexed
+                else ()
+            )
+
+    User.bind(database)
+    database.create_tables([User])
+    return User
+
+
+def fill(database, rows):
+    """
+    :return: [(userid, chatid)] of the users inserted.
+    """
+    rng = random.Random(0)
+    keys = [(i, i % CHATS) for i in range(rows)]
+    with database.atomic():
+        database.cursor().executemany(
+            'INSERT INTO "user" (userid, userfirstname, chatid, karma, num_messages, level) '
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (userid, "user{}".format(userid), chatid, rng.randint(-50, 500), n, n // 100)
+                for (userid, chatid), n in zip(keys, (rng.randint(0, 50_000) for _ in keys))
+            ),
+        )
+    return keys
+
+
+def measure(function, calls):
+    """
+    :return: (median, 99th percentile) in microseconds.
+    """
+    times = []
+    for args in calls:
+        start = time.perf_counter()
+        function(*args)
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99)]
+
+
+def leaderboard(table, chatid):
+    return list(
+        table.select(table.userid, table.userfirstname, table.karma)
+        .where(table.chatid == chatid)
+        .order_by(table.karma.desc(), table.userid)
+        .limit(10)
+        .tuples()
+    )
+
+
+def run(rows):
+    number = max(20, min(2000, 20_000_000 // rows))  # Full scans get slow past 100k rows
+    rng = random.Random(1)
+    for indexed in (False, True):
+        with tempfile.TemporaryDirectory() as folder:
+            database = SqliteDatabase(os.path.join(folder, "bench.db"))
+            table = make_table(database, indexed)
+            keys = fill(database, rows)
+            lookup = get_user if indexed else old_get_user
+            existing = [(table,) + rng.choice(keys) for _ in range(number)]
+            new = [(table, rows + i, i % CHATS) for i in range(number)]
+            chats = [(table, rng.randrange(CHATS)) for _ in range(min(number, 200))]
+            for name, function, calls in (
+                ("existing user", lookup, existing),
+                ("new user", lookup, new),
+                ("karma top 10", leaderboard, chats),
+            ):
+                median, p99 = measure(function, calls)
+                print(
+                    "{:>9} rows  {:<10} {:<14} median {:>10.1f} us  p99 {:>10.1f} us".format(
+                        rows, "indexed" if indexed else "no index", name, median, p99
+                    )
+                )
+            database.close()
+
+
+if __name__ == "__main__":
+    for size in [int(arg) for arg in sys.argv[1:]] or SIZES:
+        run(size)
@@ -0,0 +1,123 @@
+"""
+Latency from an update reaching the Bot API to the bot's answer, with polling and with the
+webhook, against a local stub of the Bot API.
+
+The stub answers a waiting getUpdates as soon as an update arrives, as Telegram does, so polling
+only loses the time to send the next getUpdates; the latency adds to every request, including the
+answers of the bot.
+
+Run from the repo folder: python benchmarks/bench_webhook.py [one-way latency in ms ...]
+"""
+import os
+import random
+import socket
+import statistics
+import sys
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.ext import CommandHandler, Updater  # noqa: E402
+
+
+from modules.webhook import WebhookServer  # noqa: E402
+from tests.stub_bot_api import StubBotAPI, TOKEN  # noqa: E402
+
+
+NUMBER = 200
+BURST = 50
+
+
+def ping(update_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "from": {"id": 1001, "is_bot": False, "first_name": "Alice"},
+            "chat": {"id": -100123, "type": "supergroup", "title": "Vroum"},
+            "date": int(time.time()),
+            "text": "/ping {}".format(update_id),
+            "entities": [{"offset": 0, "length": 5, "type": "bot_command"}],
+        },
+    }
+
+
+def make_updater(api):
+    updater = Updater(TOKEN, base_url=api.base_url)
+    updater.dispatcher.add_handler(
+        CommandHandler("ping", lambda update, context: update.message.reply_text("pong"))
+    )
+    return updater
+
+
+def latencies(api, number):
+    """
+    :return: [Seconds from each update to its answer], one update at a time.
+    """
+    rng = random.Random(0)
+    result = []
+    for update_id in range(1, number + 1):
+        start = time.perf_counter()
+        api.push(ping(update_id))
+        answered, _ = api.sent.get(timeout=30)
+        result.append(answered - start)
+        time.sleep(rng.uniform(0, 0.02))  # Not always in the same phase of the polling
+    return result
+
+
+def burst(api, first, number):
+    """
+    :return: [Seconds from each update to its answer], all the updates sent at once.
+    """
+    start = time.perf_counter()
+    for update_id in range(first, first + number):
+        api.push(ping(update_id))
+    return [api.sent.get(timeout=30)[0] - start for _ in range(number)]
+
+
+def report(mode, latency, kind, times):
+    times = sorted(times)
+    print(
+        "{:>4} ms  {:<8} {:<10} median {:>8.1f} ms  p99 {:>8.1f} ms  last {:>8.1f} ms".format(
+            latency,
+            mode,
+            kind,
+            statistics.median(times) * 1000,
+            times[int(len(times) * 0.99)] * 1000,
+            times[-1] * 1000,
+        )
+    )
+
+
+def polling(latency):
+    api = StubBotAPI(latency / 1000)
+    updater = make_updater(api)
+    updater.start_polling(poll_interval=0, timeout=10)
+    time.sleep(0.5 + 3 * latency / 1000)
+    report("polling", latency, "one by one", latencies(api, NUMBER))
+    report("polling", latency, "burst", burst(api, NUMBER + 1, BURST))
+    updater.stop()
+    api.close()
+
+
+def webhook(latency):
+    api = StubBotAPI(latency / 1000)
+    updater = make_updater(api)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = WebhookServer(
+        updater.dispatcher, "http://127.0.0.1:{}/hook".format(port), "secret", "127.0.0.1", port
+    )
+    server.start()
+    report("webhook", latency, "one by one", latencies(api, NUMBER))
+    report("webhook", latency, "burst", burst(api, NUMBER + 1, BURST))
+    server.stop()
+    api.close()
+
+
+if __name__ == "__main__":
+    for latency in [int(arg) for arg in sys.argv[1:]] or (0, 20):
+        polling(latency)
+        webhook(latency)
@@ -8,31 +8,55 @@ Main! yay!
 import logging
 
 
-from peewee import BigIntegerField, CharField, IntegerField, Model, SqliteDatabase
+from peewee import (
+    BigIntegerField,
+    CharField,
+    DatabaseProxy,
+    DateField,
+    FloatField,
+    IntegerField,
+    IntegrityError,
+    Model,
+)
 from telegram.ext import Updater
 
 
+from modules.base import Base, ProcessPool
 from modules.bot import Bot
+from modules.catchup import CatchUp
+from modules.community.buffer import UserBuffer
 from modules.community.exp import Exp
 from modules.community.karma import Karma
+from modules.community.ledger import KarmaLedger
 from modules.community.remindme import RemindMe
+from modules.community.rollups import DailyRollups
 from modules.community.services import Services
+from modules.concurrency import ChatExecutor
+from modules.database import make_database
+from modules.observers import ObserverPipeline
+from modules.router import CommandRouter
 from modules.spam.media import Media
 from modules.spam.privatejokes import PrivateJoke
 from modules.spam.text import Text
 from modules.special import Special
-from secret import TOKEN
-
-
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+from modules.webhook import WebhookServer
+from secret import (
+    CATCHUP_MAX_AGE,
+    CHAT_QUEUE_SIZE,
+    CHAT_WORKERS,
+    DATABASE_URL,
+    TOKEN,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
 )
 
+
 logger = logging.getLogger(__name__)
 
-# Database
-main_db = SqliteDatabase("./databases/main.db")
+# Database, opened by `main` only: the worker processes import this file again when they start
+main_db = DatabaseProxy()
 
 
 class User(Model):
@@ -47,6 +71,70 @@ class User(Model):
     num_messages = IntegerField(default=0)
     level = IntegerField(default=0)
 
+    class Meta:
+        """
+        Basically which database, and how to look users up.
+        """
+
+        database = main_db
+        indexes = (
+            (("userid", "chatid"), True),
+            # Leaderboards, in their order and with what they show, read from the index only
+            (("chatid", "karma", "userid", "userfirstname"), False),
+            (("chatid", "level", "num_messages", "userid", "userfirstname", "karma"), False),
+        )
+
+
+class KarmaEvent(Model):
+    """
+    Karma vote, the karma of a user being the sum of the votes they got.
+    """
+
+    chatid = BigIntegerField()
+    giver = BigIntegerField()  # 0 for the karma from before the ledger
+    receiver = BigIntegerField()
+    delta = IntegerField()
+    timestamp = IntegerField()  # Unix time
+
+    class Meta:
+        """
+        Basically which database, and how to look votes up.
+        """
+
+        database = main_db
+        indexes = ((("chatid", "receiver"), False),)
+
+
+class DailyRollup(Model):
+    """
+    Messages and karma of a user in a chat on a day (UTC), for the leaderboards over a window.
+    """
+
+    chatid = BigIntegerField()
+    userid = BigIntegerField()
+    day = DateField()
+    messages = IntegerField(default=0)
+    karma = IntegerField(default=0)
+
+    class Meta:
+        """
+        Basically which database, and how to look days up.
+        """
+
+        database = main_db
+        indexes = ((("chatid", "day", "userid"), True),)
+
+
+class MediaFile(Model):
+    """
+    Telegram file_id of the local media that were already uploaded.
+    """
+
+    path = CharField(unique=True)
+    mtime = FloatField()
+    size = BigIntegerField()
+    file_id = CharField()
+
     class Meta:
         """
         Basically which database.
@@ -55,26 +143,58 @@ class User(Model):
         database = main_db
 
 
-main_db.connect()
-main_db.create_tables([User])
+def setup_database() -> None:
+    """Open the database and create the missing tables."""
+    main_db.initialize(make_database(DATABASE_URL))
+    with main_db.connection_context():  # Each thread then connects on its own
+        try:
+            main_db.create_tables([User, KarmaEvent, DailyRollup, MediaFile])
+        except IntegrityError:  # The unique (userid, chatid) index can not be built over duplicates
+            logger.critical(
+                "Duplicated users in the database, run the scripts of migrations/ first."
+            )
+            raise SystemExit(1)
+
+    Base.file_ids = MediaFile
 
 
 def main() -> None:
     """Start the bot."""
+    # Enable logging
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+    )
+
+    setup_database()
+
     # Create the Updater and pass it the bot's token.
     updater = Updater(TOKEN)
 
     # Get the dispatcher to register handlers
     dispatcher = updater.dispatcher
 
+    # CPU-bound work, out of the dispatcher
+    offload = ProcessPool(logger)
+    Base.offload = offload
+
+    # All the commands in one handler, and all the passive observers in another
+    router = CommandRouter()
+    Base.router = router
+    observers = ObserverPipeline(logger)
+    Base.observer_pipeline = observers
+
     # Commands
     Bot(logger).add_commands(dispatcher)
     RemindMe(logger).add_commands(dispatcher)
     Special(logger).add_commands(dispatcher)
 
     # Community commands
-    Exp(logger, table=User).add_commands(dispatcher)
-    Karma(logger, table=User).add_commands(dispatcher)
+    rollups = DailyRollups(DailyRollup, User)
+    buffer = UserBuffer(User, logger, rollups=rollups)
+    exp = Exp(logger, table=User, buffer=buffer)
+    exp.add_commands(dispatcher)
+    ledger = KarmaLedger(User, KarmaEvent, buffer, logger, rollups=rollups)
+    Karma(logger, table=User, buffer=buffer, ledger=ledger).add_commands(dispatcher)
     Services(logger, table=User).add_commands(dispatcher)
 
     # Spam commands
@@ -82,26 +202,49 @@ def main() -> None:
     PrivateJoke(logger).add_commands(dispatcher)
     Text(logger).add_commands(dispatcher)
 
-    commands = ""
-    for handler in dispatcher.handlers[0]:
-        try:
-            commands += "{}\n".format(
-                "\n".join(
-                    "{} - {}".format(command, handler.callback.__name__)
-                    for command in handler.command
-                )
-            )
-        except AttributeError:
-            continue
+    dispatcher.add_handler(router)
+    dispatcher.add_handler(observers.handler(), group=1)
+
+    commands = router.get_commands_botfather()
     print("{}\nList of commands\n{}\n{}".format("*" * 13, commands, "*" * 13))
 
-    # Start the Bot
-    updater.start_polling()
+    # Handle the updates on worker threads, in order within each chat
+    executor = ChatExecutor(dispatcher, logger, CHAT_WORKERS, CHAT_QUEUE_SIZE)
+    executor.install()
 
-    # Run the bot until you press Ctrl-C or the process receives SIGINT,
-    # SIGTERM or SIGABRT. This should be used most of the time, since
-    # start_polling() is non-blocking and will stop the bot gracefully.
-    updater.idle()
+    # Start the Bot
+    buffer.start()
+    ledger.start()
+    offload.start()
+    executor.start()
+
+    # Apply what was sent while the bot was down in one go, before the usual processing
+    CatchUp(dispatcher, exp, logger, CATCHUP_MAX_AGE).run()
+
+    if WEBHOOK_URL:
+        webhook = WebhookServer(
+            dispatcher, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_LISTEN, WEBHOOK_PORT, logger
+        )
+        webhook.start()
+        updater.job_queue.start()
+
+        # Run the bot until you press Ctrl-C or a stop signal, like updater.idle() below
+        webhook.idle()
+        updater.job_queue.stop()
+    else:
+        # Also removes the webhook, if any
+        updater.start_polling()
+
+        # Run the bot until you press Ctrl-C or the process receives SIGINT,
+        # SIGTERM or SIGABRT. This should be used most of the time, since
+        # start_polling() is non-blocking and will stop the bot gracefully.
+        updater.idle()
+
+    # Finish the queued updates, then write back what is still buffered
+    executor.stop()
+    offload.stop()
+    ledger.stop()
+    buffer.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+from peewee import SqliteDatabase
+
+
+my_db = SqliteDatabase("./databases/main.db")
+
+# Merge duplicated (userid, chatid) rows into the oldest one, or the unique index can not be created
+with my_db.atomic():
+    my_db.execute_sql(
+        """
+        UPDATE user SET
+            karma = (SELECT SUM(u.karma) FROM user u WHERE u.userid = user.userid AND u.chatid = user.chatid),
+            num_messages = (SELECT MAX(u.num_messages) FROM user u WHERE u.userid = user.userid AND u.chatid = user.chatid),
+            level = (SELECT MAX(u.level) FROM user u WHERE u.userid = user.userid AND u.chatid = user.chatid),
+            userfirstname = (SELECT MAX(u.userfirstname) FROM user u WHERE u.userid = user.userid AND u.chatid = user.chatid)
+        WHERE id IN (SELECT MIN(id) FROM user GROUP BY userid, chatid HAVING COUNT(*) > 1)
+        """
+    )
+    my_db.execute_sql(
+        "DELETE FROM user WHERE id NOT IN (SELECT MIN(id) FROM user GROUP BY userid, chatid)"
+    )
+
+# Add migration here, IF NOT EXISTS as the bot may have created some of the indexes already
+my_db.execute_sql(
+    'CREATE UNIQUE INDEX IF NOT EXISTS "user_userid_chatid" ON "user" ("userid", "chatid")'
+)
+my_db.execute_sql('CREATE INDEX IF NOT EXISTS "user_chatid_karma" ON "user" ("chatid", "karma")')
+my_db.execute_sql(
+    'CREATE INDEX IF NOT EXISTS "user_chatid_level_num_messages" ON "user" ("chatid", "level", "num_messages")'
+)
@@ -0,0 +1,37 @@
+from peewee import BigIntegerField, DateField, IntegerField, Model, SqliteDatabase
+
+
+my_db = SqliteDatabase("./databases/main.db")
+
+
+class DailyRollup(Model):
+    chatid = BigIntegerField()
+    userid = BigIntegerField()
+    day = DateField()
+    messages = IntegerField(default=0)
+    karma = IntegerField(default=0)
+
+    class Meta:
+        database = my_db
+        indexes = ((("chatid", "day", "userid"), True),)
+
+
+# Add migration here
+with my_db.atomic():
+    my_db.create_tables([DailyRollup])
+    # Past messages are not dated, but the votes are, except the baseline ones (giver 0). Days
+    # of a chat the bot already rolled up are left alone, their votes being in there already
+    if "karmaevent" in my_db.get_tables():
+        my_db.execute_sql(
+            """
+            INSERT INTO dailyrollup (chatid, userid, day, messages, karma)
+            SELECT e.chatid, e.receiver, date(e.timestamp, 'unixepoch') AS day, 0, SUM(e.delta)
+            FROM karmaevent e
+            WHERE e.giver != 0 AND NOT EXISTS (
+                SELECT 1 FROM dailyrollup r
+                WHERE r.chatid = e.chatid AND r.day = date(e.timestamp, 'unixepoch')
+            )
+            GROUP BY e.chatid, e.receiver, day
+            ON CONFLICT (chatid, day, userid) DO UPDATE SET karma = karma + excluded.karma
+            """
+        )
@@ -0,0 +1,37 @@
+from peewee import BigIntegerField, IntegerField, Model, SqliteDatabase
+
+
+my_db = SqliteDatabase("./databases/main.db")
+
+
+class KarmaEvent(Model):
+    chatid = BigIntegerField()
+    giver = BigIntegerField()
+    receiver = BigIntegerField()
+    delta = IntegerField()
+    timestamp = IntegerField()
+
+    class Meta:
+        database = my_db
+        indexes = ((("chatid", "receiver"), False),)
+
+
+# Add migration here
+with my_db.atomic():
+    my_db.create_tables([KarmaEvent])
+    # The karma not in the ledger yet becomes one vote from nobody (giver 0), so that the totals
+    # match the ledger even if votes were recorded before this migration, and running it again
+    # adds nothing
+    my_db.execute_sql(
+        """
+        INSERT INTO karmaevent (chatid, giver, receiver, delta, timestamp)
+        SELECT chatid, 0, userid, missing, CAST(strftime('%s', 'now') AS INTEGER)
+        FROM (
+            SELECT u.chatid, u.userid, u.karma - COALESCE(
+                (SELECT SUM(e.delta) FROM karmaevent e WHERE e.chatid = u.chatid AND e.receiver = u.userid), 0
+            ) AS missing
+            FROM user u
+        )
+        WHERE missing != 0
+        """
+    )
@@ -0,0 +1,17 @@
+from peewee import SqliteDatabase
+
+
+my_db = SqliteDatabase("./databases/main.db")
+
+# Add migration here, IF (NOT) EXISTS as the bot may have created the new indexes already
+with my_db.atomic():
+    my_db.execute_sql('DROP INDEX IF EXISTS "user_chatid_karma"')
+    my_db.execute_sql('DROP INDEX IF EXISTS "user_chatid_level_num_messages"')
+    my_db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "user_chatid_karma_userid_userfirstname" '
+        'ON "user" ("chatid", "karma", "userid", "userfirstname")'
+    )
+    my_db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "user_chatid_level_num_messages_userid_userfirstname_karma" '
+        'ON "user" ("chatid", "level", "num_messages", "userid", "userfirstname", "karma")'
+    )
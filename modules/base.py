@@ -1,7 +1,183 @@
 """
 Base class to add new features in the bot.
 """
+from io import BytesIO
+import multiprocessing
 import os
+import queue
+import signal
+import threading
+
+
+from telegram.error import BadRequest
+from telegram.ext import CommandHandler
+
+
+from .observers import ObserverPipeline
+from .router import commands_botfather, commands_help
+
+
+def image_buffer(image, format, filename):
+    """
+    Encode an image in memory, so that it can be sent without going through the disk.
+    :param image: PIL.Image.
+    :param format: Image format, e.g. "PNG" or "WEBP".
+    :param filename: Filename shown to the users.
+    :return: io.BytesIO, ready to be sent.
+    """
+    buffer = BytesIO()
+    image.save(buffer, format)
+    buffer.seek(0)
+    buffer.name = filename
+
+    return buffer
+
+
+def cpu_bound(timeout=30):
+    """
+    Mark a module-level function as CPU-bound, to be run by a `ProcessPool`.
+    :param timeout: Seconds after which the worker running the function is killed.
+    :return: Decorator, which keeps the function as is so that it can still be pickled.
+    """
+
+    def decorator(func):
+        func.timeout = timeout
+        return func
+
+    return decorator
+
+
+def _work(connection):
+    """
+    Loop of a worker process: run the (function, arguments) received and send back the results.
+    :param connection: multiprocessing.connection.Connection, to the pool.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The bot stops its workers itself
+    while True:
+        try:
+            func, args = connection.recv()
+        except (EOFError, OSError):  # Pool stopped
+            return
+
+        try:
+            result = (True, func(*args))
+        except Exception as e:
+            result = (False, e)
+
+        try:
+            connection.send(result)
+        except Exception as e:  # Result or exception not picklable
+            connection.send((False, RuntimeError(repr(e))))
+
+
+class ProcessPool:
+    """
+    Worker processes for CPU-bound work, so that it does not hold the dispatcher.
+
+    Each worker process is driven by its own thread, which kills and replaces it when a task takes
+    longer than its timeout. Tasks wait in a bounded queue, and are refused when it is full.
+    """
+
+    def __init__(self, logger=None, workers=2, queue_size=32, timeout=30):
+        """
+        :param logger: logging.getLogger, when using a logger.
+        :param workers: Number of worker processes.
+        :param queue_size: Maximum number of waiting tasks.
+        :param timeout: Seconds before killing a task whose function has no `cpu_bound` timeout.
+        """
+        self.logger = logger
+        self.workers = workers
+        self.timeout = timeout
+
+        self._context = multiprocessing.get_context("spawn")
+        self._tasks = queue.Queue(maxsize=queue_size)
+        self._threads = []
+
+    def start(self):
+        """
+        Start the threads driving the workers, which are spawned on their first task.
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name="ProcessPool-{}".format(i))
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop the workers once the waiting tasks are done.
+        """
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, func, args, on_result, on_error):
+        """
+        :param func: Module-level function, see `cpu_bound`.
+        :param args: Tuple, arguments of `func`.
+        :param on_result: Function called with the result of `func`.
+        :param on_error: Function called with the exception raised by `func`, TimeoutError if it
+        was killed.
+        :return: False if the queue is full and the task was refused, else True.
+        """
+        try:
+            self._tasks.put_nowait((func, args, on_result, on_error))
+        except queue.Full:
+            return False
+        return True
+
+    def _spawn(self):
+        """
+        :return: (multiprocessing.Process, multiprocessing.connection.Connection to it)
+        """
+        connection, child = self._context.Pipe()
+        process = self._context.Process(target=_work, args=(child,), daemon=True)
+        process.start()
+        child.close()
+        return process, connection
+
+    def _run(self):
+        process, connection = None, None
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            func, args, on_result, on_error = task
+            timeout = getattr(func, "timeout", self.timeout)
+
+            try:
+                if process is None:
+                    process, connection = self._spawn()
+                connection.send((func, args))
+                if not connection.poll(timeout):
+                    raise TimeoutError(
+                        "{} took more than {} seconds".format(func.__name__, timeout)
+                    )
+                success, value = connection.recv()
+            except Exception as e:  # Runaway or dead worker, or task not picklable
+                success, value = False, e
+                if process is not None:
+                    process.kill()
+                    process.join()
+                    connection.close()
+                    process, connection = None, None
+
+            try:
+                if success:
+                    on_result(value)
+                else:
+                    on_error(value)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(
+                        "Could not handle the result of {}: {}".format(func.__name__, e)
+                    )
+
+        if process is not None:
+            connection.close()
+            process.join(1)
+            process.kill()
 
 
 class Base:
@@ -9,52 +185,155 @@ class Base:
     Base class to add new features in the bot.
     """
 
-    def __init__(self, logger=None, commandhandlers=None, table=None, mediafolder=None):
+    # peewee.ModelBase, where the Telegram file_ids of the uploaded media are kept
+    file_ids = None
+    _file_ids = {}
+
+    # ProcessPool running the CPU-bound work, or None to run it in the dispatcher
+    offload = None
+
+    # CommandRouter where the commands are registered, or None to add them to the dispatcher
+    router = None
+
+    # ObserverPipeline where the observers are registered, or None for one pipeline per module
+    observer_pipeline = None
+
+    def __init__(
+        self, logger=None, commandhandlers=None, table=None, mediafolder=None, observers=None
+    ):
         """
         :param logger: logging.getLogger, when using a logger.
         :param commandhandlers: [telegram.ext.CommandHandler], for command handling.
         :param table: peewee.ModelBase, when using a table in the bot's database.
+        :param observers: [function(MessageView, CallbackContext)], run on every message that is
+        not a command, see ObserverPipeline.
         """
         self.logger = logger
-        self.commandhandlers = commandhandlers
+        self.commandhandlers = commandhandlers or []
         self.table = table
         self.mediafolder = mediafolder
+        self.observers = observers or []
 
     def _media(self, filename=""):
         if self.mediafolder:
             return os.path.join(self.mediafolder, filename)
 
+    def _get_file_id(self, path, stat):
+        """
+        :param path: Path of the media.
+        :param stat: os.stat_result of the media.
+        :return: Telegram file_id if that version of the media was already uploaded, else None.
+        """
+        if path not in self._file_ids and self.file_ids is not None:
+            row = self.file_ids.get_or_none(self.file_ids.path == path)
+            if row:
+                self._file_ids[path] = (row.mtime, row.size, row.file_id)
+
+        mtime, size, file_id = self._file_ids.get(path, (None, None, None))
+        if mtime == stat.st_mtime and size == stat.st_size:
+            return file_id
+        return None
+
+    def _set_file_id(self, path, stat, file_id):
+        """
+        :param path: Path of the media.
+        :param stat: os.stat_result of the media.
+        :param file_id: Telegram file_id of the media, or None to forget it.
+        """
+        if file_id is None:
+            self._file_ids.pop(path, None)
+            if self.file_ids is not None:
+                self.file_ids.delete().where(self.file_ids.path == path).execute()
+            return
+
+        self._file_ids[path] = (stat.st_mtime, stat.st_size, file_id)
+        if self.file_ids is not None:
+            self.file_ids.insert(
+                path=path, mtime=stat.st_mtime, size=stat.st_size, file_id=file_id
+            ).on_conflict_replace().execute()
+
+    def _send_media(self, send, kind, path, **kwargs):
+        """
+        Send a local media, by file_id if it was already uploaded, else upload it.
+        :param send: Sending method, e.g. `update.message.reply_photo` or `bot.send_video`.
+        :param kind: Name of the media argument of `send`, e.g. "photo" or "video".
+        :param path: Path of the media.
+        :param kwargs: Other arguments for `send`.
+        :return: telegram.Message
+        """
+        path = os.path.normpath(path)
+        stat = os.stat(path)
+
+        file_id = self._get_file_id(path, stat)
+        if file_id:
+            try:
+                return send(**{kind: file_id}, **kwargs)
+            except BadRequest:  # Stale or rejected file_id, upload again
+                self._set_file_id(path, stat, None)
+
+        with open(path, "rb") as file:
+            message = send(**{kind: file}, **kwargs)
+
+        attachment = message.effective_attachment
+        if isinstance(attachment, list):  # Photos, the last one is the biggest
+            attachment = attachment[-1]
+        if attachment:
+            self._set_file_id(path, stat, attachment.file_id)
+
+        return message
+
+    def _offload(self, update, func, args, on_result):
+        """
+        Run a CPU-bound function (see `cpu_bound`) in `Base.offload`, then use its result.
+        :param update: telegram.Update, to tell the user when something goes wrong.
+        :param func: Module-level function.
+        :param args: Tuple, arguments of `func`.
+        :param on_result: Function called with the result of `func`, e.g. to reply with it.
+        """
+        if self.offload is None:
+            on_result(func(*args))
+            return
+
+        def on_error(error):
+            if isinstance(error, TimeoutError):
+                update.message.reply_text("This is taking too much time :/")
+                return
+            if self.logger:
+                self.logger.error("{} failed: {!r}".format(func.__name__, error))
+            update.message.reply_text("Something went wrong, sorry :/")
+
+        if not self.offload.submit(func, args, on_result, on_error):
+            update.message.reply_text("I'm a bit busy right now, try again later!")
+
     def add_commands(self, dispatcher):
         """
-        Add all self.commandhandlers to the provided dispatcher.
+        Add all self.commandhandlers to the provided dispatcher, the commands going to
+        `Base.router` if any, and all self.observers to `Base.observer_pipeline`.
         :param dispatcher: telegram.ext.Dispatcher
         """
         for commandhandler in self.commandhandlers:
-            dispatcher.add_handler(commandhandler)
+            if self.router is not None and type(commandhandler) is CommandHandler:
+                self.router.add(commandhandler)
+            else:
+                dispatcher.add_handler(commandhandler)
+
+        if not self.observers:
+            return
+        if self.observer_pipeline is not None:
+            for observer in self.observers:
+                self.observer_pipeline.add(observer)
+        else:  # In a group of its own, so that it does not hide the other handlers
+            pipeline = ObserverPipeline(self.logger, self.observers)
+            dispatcher.add_handler(pipeline.handler(), group=max(dispatcher.groups, default=0) + 1)
 
     def get_commands(self):
         """
         :return: Aliases and commands in text format.
         """
-        commands = ""
-        for handler in self.commandhandlers:
-            try:
-                commands += "- {} => {};\n".format(
-                    ", ".join(handler.command), handler.callback.__name__
-                )
-            except:
-                continue
+        return commands_help(self.commandhandlers)
 
     def get_commands_botfather(self):
         """
         :return: Aliases and commands but formatted for botfather.
         """
-        commands = ""
-        for handler in self.commandhandlers:
-            try:
-                commands += [
-                    "{} - {}\n".format(command, handler.callback.__name__)
-                    for command in handler.command
-                ]
-            except:
-                continue
+        return commands_botfather(self.commandhandlers)
@@ -0,0 +1,112 @@
+"""
+Catch up on the updates sent while the bot was down, before the normal processing starts.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+
+from telegram.error import TelegramError
+from telegram.ext import Filters
+
+
+class CatchUp:
+    """
+    Drain the updates Telegram kept for us, and apply them in bulk instead of one by one.
+
+    Messages that are not commands only count for the experience, so they are counted per user
+    and applied at once, with at most one level up card per user. Commands older than the maximum
+    age are dropped, as answering them now would only be noise; the other updates, including the
+    documents (e.g. exported histories), are dispatched normally.
+    """
+
+    def __init__(self, dispatcher, exp, logger=None, max_age=300, limit=100):
+        """
+        :param dispatcher: telegram.ext.Dispatcher
+        :param exp: Exp module, counting the messages.
+        :param logger: logging.getLogger, when using a logger.
+        :param max_age: Age in seconds after which a command is dropped.
+        :param limit: Number of updates fetched at once, from 1 to 100.
+        """
+        self.dispatcher = dispatcher
+        self.exp = exp
+        self.logger = logger
+        self.max_age = timedelta(seconds=max_age)
+        self.limit = limit
+
+    @staticmethod
+    def _is_message(update):
+        """
+        :param update: telegram.Update
+        :return: True if the update is a message from a user that is neither a command nor a
+        document, which may have a handler of its own.
+        """
+        return bool(
+            Filters.update.message(update)
+            and not Filters.command(update)
+            and not update.message.document
+            and update.effective_user
+        )
+
+    def _is_old_command(self, update, now):
+        """
+        :param update: telegram.Update
+        :param now: Aware datetime.
+        :return: True if the update is a command older than the maximum age.
+        """
+        message = update.effective_message
+        return bool(message and Filters.command(update) and now - message.date > self.max_age)
+
+    def run(self):
+        """
+        Fetch the pending updates until none is left, apply them, then acknowledge them so that
+        the polling (or the webhook) does not receive them again.
+        """
+        bot = self.dispatcher.bot
+        counts = Counter()
+        last_updates = {}
+        pending = []
+        dropped = 0
+        offset = None
+        now = datetime.now(timezone.utc)
+
+        try:
+            bot.delete_webhook()  # Telegram refuses getUpdates while a webhook is set
+            while True:
+                updates = bot.get_updates(offset=offset, limit=self.limit, timeout=0)
+                for update in updates:
+                    offset = update.update_id + 1
+                    if self._is_message(update):
+                        key = (update.effective_chat.id, update.effective_user.id)
+                        counts[key] += 1
+                        last_updates[key] = update
+                    elif self._is_old_command(update, now):
+                        dropped += 1
+                    else:
+                        pending.append(update)
+                if len(updates) < self.limit:
+                    break
+        except TelegramError as e:
+            if self.logger:
+                self.logger.error("Could not fetch the pending updates: {}".format(e))
+            return
+
+        if offset is None:
+            return
+
+        levelups = self.exp.catch_up(counts, last_updates)
+        for update in pending:
+            self.dispatcher.process_update(update)
+
+        try:
+            bot.get_updates(offset=offset, limit=1, timeout=0)  # Confirms everything before offset
+        except TelegramError as e:
+            if self.logger:
+                self.logger.error("Could not acknowledge the pending updates: {}".format(e))
+
+        if self.logger:
+            self.logger.info(
+                "Caught up on {} messages from {} users ({} level ups), {} old commands dropped, "
+                "{} other updates dispatched.".format(
+                    sum(counts.values()), len(counts), levelups, dropped, len(pending)
+                )
+            )
@@ -0,0 +1,154 @@
+"""
+Write-behind buffer for the users table.
+"""
+from contextlib import contextmanager
+import threading
+
+
+from .helpers import get_user
+
+
+class UserBuffer:
+    """
+    Keep hot `User` rows in memory and write them back to the database in batches.
+
+    Rows are keyed by (chatid, userid). Changes to `BUFFERED_FIELDS` are only applied in memory, and
+    dirty rows are flushed in one transaction every `interval` seconds, as soon as `max_dirty` rows
+    are dirty, and when the buffer is stopped.
+    """
+
+    BUFFERED_FIELDS = ("num_messages", "userfirstname", "level")
+    # Rows per statement, 7 parameters each, below the SQLite limit of 999 parameters
+    BATCH = 100
+
+    def __init__(
+        self, table, logger=None, interval=30, max_dirty=200, max_rows=10000, rollups=None
+    ):
+        """
+        :param table: peewee.ModelBase, the users table.
+        :param logger: logging.getLogger, when using a logger.
+        :param interval: Seconds between two periodic flushes.
+        :param max_dirty: Number of dirty rows that triggers a flush.
+        :param max_rows: Number of rows above which clean rows are dropped after a flush.
+        :param rollups: DailyRollups, written along with the rows.
+        """
+        self.table = table
+        self.logger = logger
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self.max_rows = max_rows
+        self.rollups = rollups
+
+        self._rows = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, userid, chatid):
+        """
+        Return the user from the buffer, loading it from the database if needed.
+        :param userid: Telegram userid.
+        :param chatid: Telegram chatid.
+        :return: Model: User
+        """
+        key = (chatid, userid)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = get_user(self.table, userid, chatid)
+                self._rows[key] = row
+            return row
+
+    @contextmanager
+    def edit(self, userid, chatid, autoflush=True):
+        """
+        Give exclusive access to a buffered user, and mark it dirty afterwards.
+        :param userid: Telegram userid.
+        :param chatid: Telegram chatid.
+        :param autoflush: False to not flush when there are too many dirty rows, e.g. to flush a
+        batch of changes at once.
+        :return: Model: User
+        """
+        with self._lock:
+            row = self.get(userid, chatid)
+            yield row
+            self._dirty.add((chatid, userid))
+            must_flush = autoflush and len(self._dirty) >= self.max_dirty
+
+        if must_flush:
+            self.flush()
+
+    @contextmanager
+    def bypass(self, chatid=None):
+        """
+        Hold the buffer while the rows of a chat are written directly to the database, so that
+        they are reloaded from it afterwards.
+        :param chatid: Telegram chatid, None for all the chats.
+        """
+        with self._lock:
+            self.flush()
+            yield
+            for key in [key for key in self._rows if chatid is None or key[0] == chatid]:
+                del self._rows[key]
+
+    def sync(self, userid, chatid, **values):
+        """
+        Update fields written to the database by someone else, if that user is buffered.
+        :param userid: Telegram userid.
+        :param chatid: Telegram chatid.
+        :param values: New values of the fields, e.g. `karma=3`.
+        """
+        with self._lock:
+            row = self._rows.get((chatid, userid))
+            if row is not None:
+                for field, value in values.items():
+                    setattr(row, field, value)
+
+    def flush(self):
+        """
+        Write all dirty rows to the database in one transaction.
+        :return: Number of rows written.
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+
+            rows = [self._rows[key] for key in self._dirty]
+            fields = [getattr(self.table, field) for field in self.BUFFERED_FIELDS]
+            with self.table._meta.database.atomic():
+                self.table.bulk_update(rows, fields=fields, batch_size=self.BATCH)
+                if self.rollups is not None:
+                    self.rollups.flush()
+            self._dirty.clear()
+
+            if len(self._rows) > self.max_rows:
+                self._rows.clear()
+
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error("Could not flush the user buffer: {}".format(e))
+
+    def start(self):
+        """
+        Start flushing periodically in a background thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="UserBuffer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread and flush what is left.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
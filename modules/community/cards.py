@@ -0,0 +1,162 @@
+"""
+Level cards rendering, with everything that does not depend on the user prepared once.
+"""
+from functools import lru_cache
+import os
+import re
+
+
+from PIL import Image, ImageDraw, ImageFont
+
+
+from ..base import cpu_bound, image_buffer
+
+
+# All hardcoded
+ICON_BOX = (45, 46)
+TITLE_BOX = (178, 0)
+INFO_BOX = (178, 90)
+TITLE_SIZE = 70
+TEXT_WIDTH = 575
+BLACK = (0, 0, 0)
+
+
+class CardRenderer:
+    """
+    Render the level cards from templates loaded at startup.
+    """
+
+    def __init__(self, folder):
+        """
+        :param folder: Folder with the font, the `basis` templates and the `icons`.
+        """
+        self.font_path = os.path.join(folder, "ReemKufi-Regular.ttf")
+        self.font = lru_cache(maxsize=None)(self._font)
+        self.fit_up = lru_cache(maxsize=1024)(self._fit_up)
+        self.fit_down = lru_cache(maxsize=1024)(self._fit_down)
+
+        with Image.open(os.path.join(folder, "icons", "stonks.png")) as icon:
+            levelup_icon = icon.convert("RGBA")
+        with Image.open(os.path.join(folder, "icons", "info.png")) as icon:
+            info_icon = icon.convert("RGBA")
+
+        self.levelup_templates = {}
+        self.info_templates = {}
+        basis = os.path.join(folder, "basis")
+        for filename in os.listdir(basis):
+            match = re.fullmatch(r"\((\d+)\)\.png", filename)
+            if not match:
+                continue
+            level = int(match.group(1))
+            with Image.open(os.path.join(basis, filename)) as image:
+                template = image.convert("RGBA")
+
+            info = template.copy()
+            info.paste(info_icon, box=ICON_BOX, mask=info_icon)
+            self.info_templates[level] = info
+
+            levelup = template
+            levelup.paste(levelup_icon, box=ICON_BOX, mask=levelup_icon)
+            ImageDraw.Draw(levelup).text(
+                TITLE_BOX, "Level Up!", font=self.font(TITLE_SIZE), fill=BLACK
+            )
+            self.levelup_templates[level] = levelup
+
+    def _font(self, size):
+        return ImageFont.truetype(self.font_path, size)
+
+    def _width(self, text, size):
+        return self.font(size).getsize(text)[0]
+
+    def _fit_up(self, text):
+        """
+        Smallest font size for which the text is at least as wide as the card.
+        """
+        low, high = 1, TITLE_SIZE
+        while self._width(text, high) < TEXT_WIDTH:
+            low, high = high + 1, high * 2
+        while low < high:
+            middle = (low + high) // 2
+            if self._width(text, middle) < TEXT_WIDTH:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _fit_down(self, text):
+        """
+        Biggest font size, up to the title size, for which the text fits in the card.
+        """
+        low, high = 1, TITLE_SIZE
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._width(text, middle) > TEXT_WIDTH:
+                high = middle - 1
+            else:
+                low = middle
+        return low
+
+    @staticmethod
+    def _template(templates, level):
+        return templates[min(max(level, min(templates)), max(templates))].copy()
+
+    def level_up(self, firstname, level):
+        """
+        :param firstname: Name of the user.
+        :param level: New level of the user.
+        :return: (PIL.Image, caption: String)
+        """
+        image = self._template(self.levelup_templates, level)
+        text = "{} is now Level {}".format(firstname, level)
+        ImageDraw.Draw(image).text(INFO_BOX, text, font=self.font(self.fit_up(text)), fill=BLACK)
+        return image, text
+
+    def info(self, firstname, level, num_messages, karma):
+        """
+        :param firstname: Name of the user.
+        :param level: Level of the user.
+        :param num_messages: Number of messages of the user.
+        :param karma: Karma of the user.
+        :return: (PIL.Image, caption: String)
+        """
+        image = self._template(self.info_templates, level)
+        text = "Level {} ({} msg, {} krm)".format(level, num_messages, karma)
+        draw = ImageDraw.Draw(image)
+        draw.text(TITLE_BOX, firstname, font=self.font(self.fit_down(firstname)), fill=BLACK)
+        draw.text(INFO_BOX, text, font=self.font(self.fit_up(text)), fill=BLACK)
+        return image, text
+
+
+@lru_cache(maxsize=None)
+def renderer(folder):
+    """
+    :param folder: Folder with the font, the `basis` templates and the `icons`.
+    :return: CardRenderer, loaded once per process.
+    """
+    return CardRenderer(folder)
+
+
+@cpu_bound(timeout=10)
+def render_level_up(folder, firstname, level):
+    """
+    :param folder: Folder with the font, the `basis` templates and the `icons`.
+    :param firstname: Name of the user.
+    :param level: New level of the user.
+    :return: (Bytes of the WEBP card, caption: String)
+    """
+    image, text = renderer(folder).level_up(firstname, level)
+    return image_buffer(image, "WEBP", "levelup.webp").getvalue(), text
+
+
+@cpu_bound(timeout=10)
+def render_info(folder, firstname, level, num_messages, karma):
+    """
+    :param folder: Folder with the font, the `basis` templates and the `icons`.
+    :param firstname: Name of the user.
+    :param level: Level of the user.
+    :param num_messages: Number of messages of the user.
+    :param karma: Karma of the user.
+    :return: (Bytes of the WEBP card, caption: String)
+    """
+    image, text = renderer(folder).info(firstname, level, num_messages, karma)
+    return image_buffer(image, "WEBP", "level.webp").getvalue(), text
@@ -1,87 +1,121 @@
-import ast
+import html
 import os
+import tempfile
+import time
 
 
-from PIL import Image, ImageDraw, ImageFont
+from peewee import chunked, EXCLUDED, Tuple
 from telegram import ForceReply, Update
-from telegram.error import BadRequest
-from telegram.ext import CallbackContext, CommandHandler, ConversationHandler, Filters, MessageHandler
+from telegram.constants import PARSEMODE_HTML
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import CallbackContext, CallbackQueryHandler, CommandHandler, ConversationHandler, Filters, MessageHandler
+import numpy as np
 
 
-from secret import BOT_ID
+from secret import ADMIN_ID, BOT_ID
 
 
 from ..base import Base
-from .helpers import deobfuscate, get_user, obfuscate
-
-
-def needed_exp(level, karma):
-    if level == 0:
-        return 0
-    # Dirty hack
-    if level == 1:
-        return 5
-    return int((level ** 3.14) * (1 - (karma / (level ** 3.14))))
+from ..observers import MessageView
+from . import cards, pages
+from .export import count_messages
+from .helpers import decode_history, decode_legacy_history, get_encoded_num_messages, HISTORY_VERSION
+from .levels import get_level, get_levels
+from .rollups import parse_window, window_label, WINDOWS
 
 
 GENDER, PHOTO, LOCATION, BIO = range(4)
 
 
 class Exp(Base):
-    def __init__(self, logger=None, table=None):
+    # Rows per statement when importing, below the SQLite limit of 999 parameters
+    IMPORT_BATCH = 300
+    # Seconds between two recomputations of all the levels
+    RECOMPUTE_INTERVAL = 24 * 60 * 60
+
+    def __init__(self, logger=None, table=None, *, buffer):
         commandhandlers = [
-            MessageHandler(~Filters.command, self.add_message),
             CommandHandler(["level", "mylevel"], self.get_level),
             CommandHandler(["levels", "leaderboard"], self.get_leaderboard),
             CommandHandler(["reset_levels"], self.reset_from_history),
-            MessageHandler(Filters.document, self.get_obfuscated_history),
+            CommandHandler(["recompute_levels"], self.recompute),
+            CallbackQueryHandler(self.leaderboard_page, pattern=r"^levels:"),
+            MessageHandler(
+                Filters.document.file_extension("json") & Filters.chat_type.private,
+                self.get_encoded_history,
+            ),
         ]
-        super().__init__(logger, commandhandlers, table, mediafolder="./media/exp")
-
-    def add_message(self, update: Update, context: CallbackContext):
-        user = update.effective_user
-        dbuser = get_user(self.table, user.id, update.message.chat.id)
-        dbuser.num_messages += 1
-        dbuser.userfirstname = user.first_name
-
-        change = dbuser.level
-        while dbuser.num_messages > needed_exp(dbuser.level, dbuser.karma):
-            dbuser.level += 1
-
-        if change != dbuser.level:
-            filename = os.path.join(self._media("basis"), "({}).png".format(dbuser.level))
-            with Image.open(filename).convert("RGBA") as image:
-                font_path = self._media("ReemKufi-Regular.ttf")
-                d1 = ImageDraw.Draw(image)
-
-                # Icon
-                icon = Image.open(self._media("icons/stonks.png")).convert("RGBA")
-                image.paste(icon, box=(45, 46), mask=icon)  # hardcoded
-
-                # Title
-                font = ImageFont.truetype(font_path, 70)  # hardcoded
-                d1.text((178, 0), "Level Up!", font=font, fill=(0, 0, 0))
-
-                # Info
-                text = "{} is now Level {}".format(dbuser.userfirstname, dbuser.level)
-                fontsize = 1
-                font = ImageFont.truetype(font_path, fontsize)
-                while font.getsize(text)[0] < 575:  # hardcoded
-                    fontsize += 1
-                    font = ImageFont.truetype(font_path, fontsize)
-                d1.text((178, 90), text, font=font, fill=(0, 0, 0))  # hardcoded
-
-                image.save("temp.webp", "WEBP")
-
-            with open("temp.webp", "rb") as file:
-                update.message.reply_document(
-                    document=file,
-                    caption=text,
-                )
+        super().__init__(
+            logger, commandhandlers, table, mediafolder="./media/exp", observers=[self.add_message]
+        )
+        self.buffer = buffer  # Shared by the modules, started and flushed by main
+        cards.renderer(self.mediafolder)  # Fail early if the templates are missing
+
+    def add_message(self, view: MessageView, context: CallbackContext):
+        with self.buffer.edit(view.userid, view.chatid) as dbuser:
+            dbuser.num_messages += 1
+            dbuser.userfirstname = view.firstname
+
+            change = dbuser.level
+            dbuser.level = get_level(dbuser.num_messages, dbuser.karma, dbuser.level)
+            level = dbuser.level
+        if self.buffer.rollups is not None:
+            self.buffer.rollups.add(view.chatid, view.userid, view.message.date.date(), messages=1)
+
+        if change != level:
+            self._level_up(view.update, view.firstname, level)
+
+    def add_commands(self, dispatcher):
+        super().add_commands(dispatcher)
+        if dispatcher.job_queue:
+            dispatcher.job_queue.run_repeating(
+                self.recompute_job, self.RECOMPUTE_INTERVAL, first=self.RECOMPUTE_INTERVAL
+            )
 
-            os.remove("temp.webp")
+    def _level_up(self, update, firstname, level):
+        """
+        Reply to a message with the level up card of its author.
+        :param update: telegram.Update
+        :param firstname: Name of the user.
+        :param level: New level of the user.
+        """
+        self._offload(
+            update,
+            cards.render_level_up,
+            (self.mediafolder, firstname, level),
+            lambda card: update.effective_message.reply_document(
+                document=card[0], filename="levelup.webp", caption=card[1]
+            ),
+        )
 
-        dbuser.save()
+    def catch_up(self, counts, last_updates):
+        """
+        Count the messages sent while the bot was down in one transaction, with at most one level
+        up card per user.
+        :param counts: {(chatid, userid): Number of messages}
+        :param last_updates: {(chatid, userid): telegram.Update, last message of the user}
+        :return: Number of users who levelled up.
+        """
+        levelups = []
+        for (chatid, userid), count in counts.items():
+            update = last_updates[(chatid, userid)]
+            firstname = update.effective_user.first_name
+            with self.buffer.edit(userid, chatid, autoflush=False) as dbuser:
+                dbuser.num_messages += count
+                dbuser.userfirstname = firstname
+
+                change = dbuser.level
+                dbuser.level = get_level(dbuser.num_messages, dbuser.karma, dbuser.level)
+                if change != dbuser.level:
+                    levelups.append((update, firstname, dbuser.level))
+            if self.buffer.rollups is not None:
+                day = update.effective_message.date.date()
+                self.buffer.rollups.add(chatid, userid, day, messages=count)
+        self.buffer.flush()
+
+        for update, firstname, level in levelups:
+            self._level_up(update, firstname, level)
+        return len(levelups)
 
     def get_level(self, update: Update, context: CallbackContext):
         if update.message.reply_to_message:
@@ -89,120 +123,242 @@ class Exp(Base):
             if user.id == BOT_ID:
                 update.message.reply_text("I don't level up, silly ~")
                 return
-            dbuser = get_user(self.table, user.id, update.message.chat.id)
         else:
             user = update.effective_user
-            dbuser = get_user(self.table, user.id, update.message.chat.id)
-        dbuser.userfirstname = user.first_name
-
-        filename = os.path.join(self._media("basis"), "({}).png".format(dbuser.level))
-        with Image.open(filename).convert("RGBA") as image:
-            font_path = self._media("ReemKufi-Regular.ttf")
-            d1 = ImageDraw.Draw(image)
-
-            # Icon
-            icon = Image.open(self._media("icons/info.png")).convert("RGBA")
-            image.paste(icon, box=(45, 46), mask=icon)  # hardcoded
-
-            # Title
-            fontsize = 70  # hardcoded
-            font = ImageFont.truetype(font_path, fontsize)
-            while font.getsize(dbuser.userfirstname)[0] > 575:  # hardcoded
-                fontsize -= 1
-                font = ImageFont.truetype(font_path, fontsize)
-            d1.text((178, 0), dbuser.userfirstname, font=font, fill=(0, 0, 0))
-
-            # Info
-            text = "Level {} ({} msg, {} krm)".format(
-                dbuser.level, dbuser.num_messages, dbuser.karma
-            )
-            fontsize = 1
-            font = ImageFont.truetype(font_path, fontsize)
-            while font.getsize(text)[0] < 575:  # hardcoded
-                fontsize += 1
-                font = ImageFont.truetype(font_path, fontsize)
-            d1.text((178, 90), text, font=font, fill=(0, 0, 0))  # hardcoded
-
-            image.save("temp.webp", "WEBP")
-
-        with open("temp.webp", "rb") as file:
-            update.message.reply_document(
-                document=file,
-                caption=text,
-            )
-
-        os.remove("temp.webp")
-
-        dbuser.save()
+        with self.buffer.edit(user.id, update.message.chat.id) as dbuser:
+            dbuser.userfirstname = user.first_name
+            level, num_messages, karma = dbuser.level, dbuser.num_messages, dbuser.karma
+
+        self._offload(
+            update,
+            cards.render_info,
+            (self.mediafolder, user.first_name, level, num_messages, karma),
+            lambda card: update.message.reply_document(
+                document=card[0], filename="level.webp", caption=card[1]
+            ),
+        )
 
     def get_leaderboard(self, update: Update, context: CallbackContext):
+        window, num_people = parse_window(context.args or [])
+        num_people = pages.page_size(num_people)
+        if window and self.buffer.rollups is not None:
+            self._get_window_leaderboard(update, window, num_people)
+            return
+
+        text, markup = self._leaderboard_page(update.message.chat.id, num_people)
+        update.message.reply_text(text, reply_markup=markup)
+
+    def _get_levels(self, chatid, num_people, after=None):
+        """
+        List the levels from a chat, highest first, without the users at level 0.
+        :param chatid: Telegram chatid.
+        :param num_people: Maximum number of users.
+        :param after: (level, num_messages, userid) of the last user of the previous page, None
+        from the top.
+        :return: [(userid, userfirstname, level, num_messages, karma)]
+        """
+        self.buffer.flush()
+        table = self.table
+        query = table.select(
+            table.userid, table.userfirstname, table.level, table.num_messages, table.karma
+        ).where((table.chatid == chatid) & (table.level > 0) & (table.userid != BOT_ID))
+        if after is not None:
+            query = query.where(
+                Tuple(table.level, table.num_messages, table.userid) < Tuple(*after)
+            )
+        query = query.order_by(
+            table.level.desc(), table.num_messages.desc(), table.userid.desc()
+        ).limit(num_people)
+
+        return list(query.tuples())
+
+    def _leaderboard_page(self, chatid, size, start=0, after=None):
+        """
+        :param chatid: Telegram chatid.
+        :param size: Number of people per page.
+        :param start: Rank of the first user of the page, from 0.
+        :param after: See `_get_levels`.
+        :return: (Text, InlineKeyboardMarkup or None) of the page.
+        """
+        users = self._get_levels(chatid, size + 1, after)
+        all_people = pages.fit(
+            [
+                "{}. {}: Level {} ({} msg, {} krm).".format(
+                    start + i + 1,
+                    pages.name(username, "<No registered username>"),
+                    level,
+                    num_messages,
+                    karma,
+                )
+                for i, (_, username, level, num_messages, karma) in enumerate(users[:size])
+            ]
+        )
+        if not all_people:
+            return "No one talked yet... ):", None
+
+        cursor = None
+        if len(users) > len(all_people):
+            userid, _, level, num_messages, _ = users[len(all_people) - 1]
+            cursor = (level, num_messages, userid)
+        markup = pages.keyboard("levels", size, start, start + len(all_people), cursor)
+        return "\n".join(all_people), markup
+
+    def leaderboard_page(self, update: Update, context: CallbackContext):
+        """
+        Show another page of the levels, from the buttons under them.
+        """
+        query = update.callback_query
         try:
-            _, num_people = update.message.text.split(" ", 1)
-            num_people = int(num_people)
-            if num_people < 1:
-                num_people = 10
+            size, start, after = pages.parse(query.data)
         except ValueError:
-            num_people = 10
-
-        users = (
-            self.table.select()
-            .where(self.table.chatid == update.message.chat.id)
-            .order_by(self.table.level.desc())
-            .order_by(self.table.num_messages.desc())
-            .limit(num_people)
-        )
-
-        levels = {
-            user.userid: [user.userfirstname, user.level, user.num_messages, user.karma]
-            for user in users
-        }
+            query.answer()
+            return
+        text, markup = self._leaderboard_page(query.message.chat.id, size, start, after)
+        query.answer()
         try:
-            _ = levels.pop(BOT_ID)
-        except KeyError:  # Not the correct bot
+            query.edit_message_text(text, reply_markup=markup)
+        except BadRequest:  # Same page as before
             pass
-        num_people = min(len(levels), num_people)
-
-        all_people = []
-        for i, (userid, data) in enumerate(levels.items()):
-            if i < num_people:
-                username, level, num_messages, karma = data
-                if level > 0:
-                    if not username:
-                        username = "<No registered username>"
-                        dbuser = get_user(self.table, userid, update.message.chat.id)
-                        while dbuser.num_messages > needed_exp(dbuser.level, dbuser.karma):
-                            dbuser.level += 1
-                        level = dbuser.level
-                        dbuser.save()
-                    all_people.append(
-                        "{}. {}: Level {} ({} msg, {} krm).".format(
-                            i + 1, username, level, num_messages, karma
-                        )
-                    )
-            else:
-                break
+
+    def import_counts(self, chatid, counts):
+        """
+        Set the number of messages of users of a chat, e.g. from an export, in one transaction.
+        :param chatid: Telegram chatid.
+        :param counts: {userid: Number of messages}
+        :return: Number of users updated.
+        """
+        table = self.table
+        rows = [
+            {"userid": userid, "chatid": chatid, "num_messages": num_messages}
+            for userid, num_messages in counts.items()
+            if userid != BOT_ID
+        ]
+
+        with self.buffer.bypass(chatid), table._meta.database.atomic():
+            for batch in chunked(rows, self.IMPORT_BATCH):
+                table.insert_many(batch).on_conflict(
+                    conflict_target=[table.userid, table.chatid],
+                    update={table.num_messages: EXCLUDED.num_messages},
+                ).execute()
+
+            changed = []
+            for user in table.select().where(table.chatid == chatid):
+                if user.userid in counts:
+                    level = get_level(user.num_messages, user.karma, user.level)
+                    if level != user.level:
+                        user.level = level
+                        changed.append(user)
+            table.bulk_update(changed, fields=[table.level], batch_size=self.IMPORT_BATCH)
+
+        return len(rows)
+
+    def recompute_levels(self, chatid=None):
+        """
+        Recompute the level of every user from their messages and karma, e.g. after the formula
+        changed, writing back only the levels that changed, in one transaction.
+
+        Levels never go down, like when they are updated with each message: losing karma only
+        makes the next level further away.
+        :param chatid: Telegram chatid, None for all the chats.
+        :return: (Number of users, number of levels changed, seconds taken)
+        """
+        start = time.perf_counter()
+        table = self.table
+        database = table._meta.database
+        primary_key = table._meta.primary_key
+        query = table.select(primary_key, table.num_messages, table.karma, table.level)
+        if chatid is not None:
+            query = query.where(table.chatid == chatid)
+        update_sql, _ = table.update({table.level: 0}).where(primary_key == 0).sql()
+
+        with self.buffer.bypass(chatid), database.atomic():
+            rows = np.array(database.execute(query).fetchall(), dtype=np.int64).reshape(-1, 4)
+            levels = get_levels(rows[:, 1], rows[:, 2], rows[:, 3])
+            changed = np.flatnonzero(levels != rows[:, 3])
+            database.cursor().executemany(
+                update_sql, zip(levels[changed].tolist(), rows[changed, 0].tolist())
+            )
+
+        return len(rows), len(changed), time.perf_counter() - start
+
+    def _recompute_report(self, chatid=None):
+        """
+        :param chatid: Telegram chatid, None for all the chats.
+        :return: Text about the recomputation, which is logged too.
+        """
+        num_users, num_changed, seconds = self.recompute_levels(chatid)
+        text = "Recomputed {} levels in {:.2f} seconds ({:.0f} users/s), {} changed.".format(
+            num_users, seconds, num_users / max(seconds, 1e-9), num_changed
+        )
+        if self.logger:
+            self.logger.info(text)
+        return text
+
+    def recompute(self, update: Update, context: CallbackContext):
+        """
+        Recompute the levels of the chat, or of all the chats with "all".
+        """
+        if ADMIN_ID not in (update.effective_user.id, update.message.chat.id):
+            return
+        chatid = None if context.args and context.args[0] == "all" else update.message.chat.id
+        update.message.reply_text(self._recompute_report(chatid))
+
+    def recompute_job(self, context: CallbackContext):
+        self._recompute_report()
+
+    @staticmethod
+    def _download(context, document, function):
+        """
+        Download a document to a temporary file, and give its path to a function.
+        :param context: CallbackContext
+        :param document: telegram.Document
+        :param function: Function taking the path.
+        :return: What the function returns.
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "result.json")
+            context.bot.get_file(document).download(custom_path=path)
+            return function(path)
+
+    def _get_window_leaderboard(self, update, window, num_people):
+        """
+        Reply with the users who talked the most over a window, from the daily rollups.
+        :param update: telegram.Update
+        :param window: Name of the window, see rollups.WINDOWS.
+        :param num_people: Maximum number of users.
+        """
+        self.buffer.flush()
+        users = self.buffer.rollups.top(
+            update.message.chat.id, "messages", WINDOWS[window], num_people
+        )
+        all_people = pages.fit(
+            [
+                "{}. {}: {} msg.".format(
+                    i + 1, pages.name(username, "<No registered username>"), total
+                )
+                for i, (_, username, total) in enumerate(users)
+            ]
+        )
 
         if all_people:
-            update.message.reply_text("\n".join(all_people))
+            update.message.reply_text(
+                "Messages {}:\n{}".format(window_label(window), "\n".join(all_people))
+            )
         else:
-            update.message.reply_text("No one talked yet... ):")
+            update.message.reply_text("No one talked {}... ):".format(window_label(window)))
 
     def reset_from_history(self, update: Update, context: CallbackContext):
+        reply = update.message.reply_to_message
         try:
-            data = ast.literal_eval(deobfuscate(context.args[0]))
-            try:
-                update.message.delete()
-            except BadRequest:
-                update.message.reply_text("Bot is not admin, please delete the message manually.")
-            for userid, num_messages in data.items():
-                if userid == BOT_ID:
-                    continue
-                dbuser = get_user(self.table, userid, update.message.chat.id)
-                dbuser.num_messages = num_messages
-                while dbuser.num_messages > needed_exp(dbuser.level, dbuser.karma):
-                    dbuser.level += 1
-                dbuser.save()
-        except (ValueError, IndexError) as e:
+            if reply and reply.document:  # The export itself, no need for the encoded text
+                counts = self._download(context, reply.document, count_messages)
+            else:
+                counts = self._history_from_args(update, context)
+                if counts is None:  # Other chunks to come
+                    return
+            num_users = self.import_counts(update.message.chat.id, counts)
+            update.message.reply_text("Levels updated for {} users.".format(num_users))
+        except (ValueError, IndexError, TelegramError) as e:
             print(e)
             update.message.reply_text(
                 "Error while updating levels.\n\n"
@@ -210,9 +366,71 @@ class Exp(Base):
                 "https://github.com/Amustache/vroumbot/wiki"
             )
 
-    def get_obfuscated_history(self, update: Update, context: CallbackContext):
-        with open("temp.json", "w+") as f:
-            context.bot.get_file(update.message.document).download(out=f)
-            text = obfuscate("".join(f.read().split()))
-            update.message.reply_text("Send that text as argument for /reset_from_history:")
-            update.message.reply_text(text)
+    @staticmethod
+    def _history_from_args(update, context):
+        """
+        Decode the history given as arguments, whose version 2 can come in several chunks.
+        :param update: telegram.Update
+        :param context: CallbackContext, the chunks already received are kept in its chat_data.
+        :return: {userid: Number of messages}, None while chunks are missing.
+        """
+        args = context.args
+        if args[0] == HISTORY_VERSION:
+            index, total = (int(number) for number in args[1].split("/"))
+            if not 1 <= index <= total:
+                raise ValueError("No chunk {} out of {}.".format(index, total))
+            chunk = args[2]
+        else:
+            counts = decode_legacy_history(args[0])
+
+        try:
+            update.message.delete()
+        except BadRequest:
+            update.message.reply_text("Bot is not admin, please delete the message manually.")
+        if args[0] != HISTORY_VERSION:
+            return counts
+
+        chunks = context.chat_data.get("history_chunks")
+        if chunks is None or len(chunks) != total:
+            chunks = context.chat_data["history_chunks"] = [None] * total
+        chunks[index - 1] = chunk
+        if None in chunks:
+            update.message.reply_text(
+                "Got part {} out of {}, waiting for the others.".format(index, total)
+            )
+            return None
+
+        del context.chat_data["history_chunks"]
+        return decode_history("".join(chunks))
+
+    def get_encoded_history(self, update: Update, context: CallbackContext):
+        try:
+            chunks = self._download(context, update.message.document, get_encoded_num_messages)
+        except ValueError as e:
+            if self.logger:
+                self.logger.info("Not a Telegram export: {}".format(e))
+            update.message.reply_text("This does not look like a Telegram export.")
+            return
+        except TelegramError as e:  # E.g. files over 20 MB, that bots can not download
+            if self.logger:
+                self.logger.warning("Could not download the export: {}".format(e))
+            update.message.reply_text(
+                "I could not download this export, bots can only get files up to 20 MB. "
+                "Export the chat again without its photos, videos and files, then send it."
+            )
+            return
+        if not chunks:
+            update.message.reply_text("No one talked in this export... ):")
+            return
+
+        update.message.reply_text(
+            "Send {} in the chat, or reply to the export with /reset_levels in the chat "
+            "itself:".format(
+                "this message" if len(chunks) == 1 else "these {} messages".format(len(chunks))
+            )
+        )
+        for chunk in chunks:
+            update.message.reply_text(
+                "<code>/reset_levels {}</code>".format(html.escape(chunk)),
+                parse_mode=PARSEMODE_HTML,
+            )
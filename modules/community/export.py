@@ -0,0 +1,176 @@
+"""
+Streaming reader for the chat exports of Telegram Desktop (`result.json`), in constant memory.
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import codecs
+import json
+import multiprocessing
+import os
+import re
+
+
+CHUNK_SIZE = 1024 * 1024  # Bytes read at once
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024  # Characters, above which the export is considered broken
+PARALLEL_SIZE = 64 * 1024 * 1024  # Bytes, above which the parsing is split across processes
+
+MESSAGES_LIST = re.compile(rb'"messages"\s*:\s*\[')
+# Telegram Desktop indents with one space, so each message of the list starts with that line;
+# raw newlines can not appear inside JSON strings, so it can not be mistaken for message content
+MESSAGE_START = b"\n  {\n"
+
+_decoder = json.JSONDecoder()
+
+
+def sender(message):
+    """
+    :param message: Dict, a message of the export.
+    :return: Userid of the sender if it is a text message from a user, None otherwise.
+    """
+    from_id = message.get("from_id") or ""
+    if (
+        message.get("type") == "message"
+        and type(message.get("text")) == str
+        and from_id.startswith("user")
+    ):
+        return int(from_id[4:])
+    return None
+
+
+def _chunks(file, start, end=None):
+    """
+    :param file: Binary file object.
+    :param start: Offset to read from.
+    :param end: Offset to read up to, None for the end of the file.
+    :return: Generator of decoded text chunks.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    file.seek(start)
+    left = None if end is None else end - start
+    while left is None or left > 0:
+        data = file.read(CHUNK_SIZE if left is None else min(CHUNK_SIZE, left))
+        if not data:
+            break
+        if left is not None:
+            left -= len(data)
+        yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+
+def _values(chunks):
+    """
+    Decode the values of a JSON list one by one, keeping at most a chunk and a value in memory.
+    :param chunks: Text chunks, starting inside the list.
+    :return: Generator of values, stopping at the end of the list or of the chunks.
+    """
+    buffer = ""
+    position = 0
+    for chunk in chunks:
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if buffer[position] == "]":
+                return
+            try:
+                value, position = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:  # Incomplete, wait for the next chunk
+                if len(buffer) - position > MAX_MESSAGE_SIZE:
+                    raise ValueError("Not a Telegram export, or a broken one.")
+                break
+            yield value
+
+    if buffer[position:].strip(" \t\r\n,"):
+        raise ValueError("Truncated Telegram export.")
+
+
+def _messages_offset(file):
+    """
+    :param file: Binary file object of the export.
+    :return: Offset right after the opening bracket of the messages list.
+    """
+    file.seek(0)
+    data = b""
+    while len(data) <= MAX_MESSAGE_SIZE:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        data += chunk
+        found = MESSAGES_LIST.search(data)
+        if found:
+            return found.end()
+    raise ValueError("No messages in this Telegram export.")
+
+
+def _next_message(file, offset):
+    """
+    :param file: Binary file object of the export.
+    :param offset: Offset to look from.
+    :return: Offset of the first message starting after it, None if there is none.
+    """
+    file.seek(offset)
+    data = b""
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            return None
+        data = data[-len(MESSAGE_START) :] + chunk
+        found = data.find(MESSAGE_START)
+        if found != -1:
+            return file.tell() - len(data) + found + 1
+
+
+def count_range(path, start, end=None):
+    """
+    Count the text messages per sender in a part of the messages list.
+    :param path: Path to the export.
+    :param start: Offset of the first message (or of the list).
+    :param end: Offset of the first message not to count, None to count up to the end of the list.
+    :return: Counter of {userid: number of messages}.
+    """
+    counts = Counter()
+    with open(path, "rb") as file:
+        for message in _values(_chunks(file, start, end)):
+            userid = sender(message)
+            if userid is not None:
+                counts[userid] += 1
+    return counts
+
+
+def count_messages(path, workers=None):
+    """
+    Count the text messages per sender in an export, without loading it whole.
+
+    Exports bigger than PARALLEL_SIZE are cut at message boundaries and counted by several
+    processes, if they are indented as Telegram Desktop does; other ones are read sequentially.
+    :param path: Path to the export.
+    :param workers: Number of processes for big exports, the number of CPUs by default.
+    :return: Counter of {userid: number of messages}.
+    """
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        start = _messages_offset(file)
+        file.seek(start)
+        formatted = file.read(len(MESSAGE_START) - 1) == MESSAGE_START[:-1]  # "[" then "\n  {"
+        if size < PARALLEL_SIZE or workers < 2 or not formatted:
+            return count_range(path, start)
+
+        offsets = [start]
+        for i in range(1, workers):
+            offset = _next_message(file, start + (size - start) * i // workers)
+            if offset is None:
+                break
+            if offset > offsets[-1]:
+                offsets.append(offset)
+
+    ranges = list(zip(offsets, offsets[1:] + [None]))
+    counts = Counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(len(ranges), mp_context=context) as executor:
+        for part in executor.map(count_range, [path] * len(ranges), *zip(*ranges)):
+            counts.update(part)
+    return counts
@@ -1,5 +1,9 @@
-from collections import Counter
-import json
+import base64
+import re
+import zlib
+
+
+from .export import count_messages
 
 
 def get_user(table, userid, chatid):
@@ -10,7 +14,12 @@ def get_user(table, userid, chatid):
     :param chatid: Telegram chatid.
     :return: Model: User
     """
-    user, _ = table.get_or_create(userid=userid, chatid=chatid)
+    query = (table.userid == userid) & (table.chatid == chatid)
+    user = table.get_or_none(query)
+    if user is None:
+        # Relies on the unique (userid, chatid) index, so concurrent inserts can not duplicate rows
+        table.insert(userid=userid, chatid=chatid).on_conflict_ignore().execute()
+        user = table.get(query)
 
     return user
 
@@ -30,21 +39,106 @@ def deobfuscate(string):
     return "".join(chr(a ^ ord(b)) for a, b in zip(splits, mask * (1 + len(string) // len(mask))))
 
 
-def get_num_messages(filepath):
-    with open(filepath, "r") as file:
-        data = json.load(file)
-    return str(
-        dict(
-            Counter(
-                [
-                    int(message["from_id"][4:])
-                    for message in data["messages"]
-                    if message["type"] == "message" and type(message["text"]) == str
-                ]
-            )
-        )
-    ).replace(" ", "")
-
-
-def get_obfuscated_num_messages(filepath):
-    return obfuscate(get_num_messages(filepath))
+# Version 1 is the obfuscated `{userid:count}` dict above, only decoded now
+LEGACY_HISTORY = re.compile(r"\{(\d+:\d+(,\d+:\d+)*)?\}")
+
+# Version 2: (userid, count) pairs sorted by userid, as varints with the userids delta-encoded,
+# deflated, after a CRC32 of the pairs, in base85
+HISTORY_VERSION = "v2"
+HISTORY_CHUNK_SIZE = 3900  # Characters of payload per message, under the 4096 limit
+# Telegram Desktop takes these for Markdown when pasted, swapped for characters base85 does not use
+B85_SAFE = str.maketrans("`*_~|", ".,[]:")
+B85_BACK = str.maketrans(".,[]:", "`*_~|")
+
+
+def _varint(number):
+    """
+    :param number: Positive int.
+    :return: Bytes, 7 bits per byte, the high bit set on all but the last byte.
+    """
+    data = bytearray()
+    while number > 0x7F:
+        data.append(number & 0x7F | 0x80)
+        number >>= 7
+    data.append(number)
+    return bytes(data)
+
+
+def _read_varints(data):
+    """
+    :param data: Bytes, varints one after the other.
+    :return: [Int]
+    """
+    numbers = []
+    number = shift = 0
+    for byte in data:
+        number |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            numbers.append(number)
+            number = shift = 0
+    if shift:
+        raise ValueError("Truncated varint.")
+    return numbers
+
+
+def encode_history(counts, chunk_size=HISTORY_CHUNK_SIZE):
+    """
+    :param counts: {userid: Number of messages}
+    :param chunk_size: Maximum number of payload characters per chunk.
+    :return: [String], arguments for /reset_levels, one message each: "v2 <index>/<total> <data>".
+    """
+    pairs = bytearray()
+    previous = 0
+    for userid, count in sorted(counts.items()):
+        pairs += _varint(userid - previous) + _varint(count)
+        previous = userid
+
+    data = zlib.crc32(pairs).to_bytes(4, "big") + zlib.compress(bytes(pairs), 9)
+    text = base64.b85encode(data).decode().translate(B85_SAFE)
+    chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+    return [
+        "{} {}/{} {}".format(HISTORY_VERSION, i + 1, len(chunks), chunk)
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def decode_history(text):
+    """
+    :param text: Data of all the chunks of a version 2 payload, joined in order.
+    :return: {userid: Number of messages}
+    :raise ValueError: If the payload is broken.
+    """
+    try:
+        data = base64.b85decode(text.translate(B85_BACK))
+        pairs = zlib.decompress(data[4:])
+    except (ValueError, zlib.error) as e:
+        raise ValueError("Broken history: {}".format(e))
+    if zlib.crc32(pairs) != int.from_bytes(data[:4], "big"):
+        raise ValueError("Broken history: wrong checksum.")
+
+    numbers = _read_varints(pairs)
+    if len(numbers) % 2:
+        raise ValueError("Broken history: odd number of values.")
+    counts = {}
+    userid = 0
+    for delta, count in zip(numbers[::2], numbers[1::2]):
+        userid += delta
+        counts[userid] = count
+    return counts
+
+
+def decode_legacy_history(string):
+    """
+    :param string: Version 1 payload, the obfuscated dict.
+    :return: {userid: Number of messages}
+    :raise ValueError: If the payload is broken.
+    """
+    text = deobfuscate(string)
+    if not LEGACY_HISTORY.fullmatch(text):
+        raise ValueError("Broken history: not a dict of counts.")
+    return {int(userid): int(count) for userid, count in re.findall(r"(\d+):(\d+)", text)}
+
+
+def get_encoded_num_messages(filepath):
+    return encode_history(count_messages(filepath))
@@ -1,13 +1,18 @@
 """
 Karma module is used to handle karma in groupchats.
 """
+from peewee import Tuple
 from telegram import Update
 from telegram.error import BadRequest
-from telegram.ext import CallbackContext, CommandHandler
+from telegram.ext import CallbackContext, CallbackQueryHandler, CommandHandler
+
+
+from secret import ADMIN_ID
 
 
 from ..base import Base
-from .helpers import get_user
+from . import pages
+from .rollups import parse_window, window_label, WINDOWS
 
 
 angrypos_commands = ["angryplus", "angrypos", "angrybravo", "angry"]
@@ -21,27 +26,84 @@ class Karma(Base):
     Karma module is used to handle karma in groupchats.
     """
 
-    def __init__(self, logger=None, table=None):
+    def __init__(self, logger=None, table=None, *, buffer, ledger):
         commandhandlers = [
             CommandHandler(
                 pos_commands + angrypos_commands + neg_commands + meh_commands, self.change_karma
             ),
             CommandHandler(["karma", "getkarma"], self.getkarma),
             CommandHandler(["setkarma"], self.setkarma),
+            CommandHandler(["rebuild_karma"], self.rebuild_karma),
+            CallbackQueryHandler(self.karma_page, pattern=r"^karma:"),
         ]
         super().__init__(logger, commandhandlers, table, mediafolder="./media")
+        self.buffer = buffer  # Shared by the modules, started and flushed by main
+        self.ledger = ledger
+
+    def _get_karma(self, chatid, num_people, after=None):
+        """
+        List the karma scores from a chat, highest first, without the users at 0.
+        :param chatid: Telegram chatid.
+        :param num_people: Maximum number of users.
+        :param after: (karma, userid) of the last user of the previous page, None from the top.
+        :return: [(user_id: Int, user_firstname: String, user_karma: Int)]
+        """
+        self.ledger.flush()
+        table = self.table
+        query = table.select(table.userid, table.userfirstname, table.karma).where(
+            (table.chatid == chatid) & (table.karma != 0)
+        )
+        if after is not None:
+            query = query.where(Tuple(table.karma, table.userid) < Tuple(*after))
+        query = query.order_by(table.karma.desc(), table.userid.desc()).limit(num_people)
+
+        return list(query.tuples())
 
-    def _get_karma(self, chatid):
+    def _karma_page(self, chatid, size, start=0, after=None):
         """
-        List all karma scores from a chat.
         :param chatid: Telegram chatid.
-        :return: {user_id: Int: [user_firstname: String, user_karma: Int]}
+        :param size: Number of people per page.
+        :param start: Rank of the first user of the page, from 0.
+        :param after: See `_get_karma`.
+        :return: (Text, InlineKeyboardMarkup or None) of the page.
         """
-        users = (
-            self.table.select().where(self.table.chatid == chatid).order_by(self.table.karma.desc())
+        users = self._get_karma(chatid, size + 1, after)
+        all_people = pages.fit(
+            [
+                "{}. {}: {} points.".format(
+                    start + i + 1,
+                    pages.name(username, "<please trigger karma action for name>"),
+                    karma,
+                )
+                for i, (_, username, karma) in enumerate(users[:size])
+            ]
         )
+        if not all_people:
+            return "No karma so far!", None
 
-        return {user.userid: [user.userfirstname, user.karma] for user in users}
+        cursor = None
+        if len(users) > len(all_people):
+            userid, _, karma = users[len(all_people) - 1]
+            cursor = (karma, userid)
+        markup = pages.keyboard("karma", size, start, start + len(all_people), cursor)
+        return "\n".join(all_people), markup
+
+    def karma_page(self, update: Update, context: CallbackContext) -> None:
+        """
+        Show another page of the karma scores, from the buttons under them.
+        """
+        query = update.callback_query
+        try:
+            size, start, after = pages.parse(query.data)
+        except ValueError:
+            query.answer()
+            return
+        text, markup = self._karma_page(query.message.chat.id, size, start, after)
+        query.answer()
+        try:
+            query.edit_message_text(text, reply_markup=markup)
+        except BadRequest:  # Same page as before
+            pass
 
     def change_karma(self, update: Update, context: CallbackContext) -> None:
         """
@@ -49,7 +111,6 @@ class Karma(Base):
         """
         if update.message.reply_to_message:
             user = update.message.reply_to_message.from_user
-            dbuser = get_user(self.table, user.id, update.message.chat.id)
             command = update.message.text.split(" ", 1)[0][1:]
             if "@" in command:
                 # command may be `somecommand@botname``
@@ -82,20 +143,25 @@ class Karma(Base):
                 else:
                     operator = 0
                     resp = "Meh"
-                dbuser.karma += operator
+                karma = self.ledger.add(
+                    update.message.chat.id, update.effective_user.id, user.id, operator
+                )
+                with self.buffer.edit(user.id, update.message.chat.id) as dbuser:
+                    dbuser.userfirstname = user.first_name
                 update.message.reply_to_message.reply_text(
-                    "{} for {} ({} points).".format(resp, user.first_name, dbuser.karma)
+                    "{} for {} ({} points).".format(resp, user.first_name, karma)
                 )
 
                 # Special, if needed
                 if command in angrypos_commands:
-                    with open(self._media("angrypos.jpg"), "rb") as file:
-                        update.message.reply_photo(photo=file, caption="Now get tf outta here.")
+                    self._send_media(
+                        update.message.reply_photo,
+                        "photo",
+                        self._media("angrypos.jpg"),
+                        caption="Now get tf outta here.",
+                    )
 
                 self.logger.info("{} gets a {}!".format(user.first_name, resp))
-
-            dbuser.userfirstname = user.first_name
-            dbuser.save()
         else:
             update.message.reply_text("You must respond to a message to give karma.")
 
@@ -105,50 +171,61 @@ class Karma(Base):
         """
         if update.message.reply_to_message:
             user = update.message.reply_to_message.from_user
-            dbuser = get_user(self.table, user.id, update.message.chat.id)
-            dbuser.userfirstname = user.first_name
-            dbuser.save()
+            with self.buffer.edit(user.id, update.message.chat.id) as dbuser:
+                dbuser.userfirstname = user.first_name
+            karma = self.ledger.karma(user.id, update.message.chat.id)
 
-            update.message.reply_text(
-                "{} has {} points.".format(dbuser.userfirstname, dbuser.karma)
-            )
-            self.logger.info("{} has {} karma!".format(dbuser.userfirstname, dbuser.karma))
+            update.message.reply_text("{} has {} points.".format(user.first_name, karma))
+            self.logger.info("{} has {} karma!".format(user.first_name, karma))
 
         else:
-            try:
-                _, num_people = update.message.text.split(" ", 1)
-                num_people = int(num_people)
-                if num_people < 1:
-                    num_people = 10
-            except ValueError:
-                num_people = 10
-
-            karmas = self._get_karma(update.message.chat.id)
-            num_people = min(len(karmas), num_people)
-
-            all_people = []
-            for i, (_, data) in enumerate(karmas.items()):
-                if i < num_people:
-                    username, karma = data
-                    if not username:
-                        username = "<please trigger karma action for name>"
-                    if karma != 0:
-                        all_people.append("{}. {}: {} points.".format(i + 1, username, karma))
-                else:
-                    break
+            window, num_people = parse_window(context.args or [])
+            num_people = pages.page_size(num_people)
+            if window and self.ledger.rollups is not None:
+                self._get_window_karma(update, window, num_people)
+                return
 
-            if all_people:
-                update.message.reply_text("\n".join(all_people))
-            else:
-                update.message.reply_text("No karma so far!")
+            text, markup = self._karma_page(update.message.chat.id, num_people)
+            update.message.reply_text(text, reply_markup=markup)
             self.logger.info(
                 "{} wants to know the karmas!".format(update.effective_user.first_name)
             )
 
+    def _get_window_karma(self, update, window, num_people):
+        """
+        Reply with the users who got the most karma over a window, from the daily rollups.
+        :param update: telegram.Update
+        :param window: Name of the window, see rollups.WINDOWS.
+        :param num_people: Maximum number of users.
+        """
+        self.ledger.flush()
+        users = self.ledger.rollups.top(
+            update.message.chat.id, "karma", WINDOWS[window], num_people
+        )
+        all_people = pages.fit(
+            [
+                "{}. {}: {} points.".format(
+                    i + 1, pages.name(username, "<please trigger karma action for name>"), karma
+                )
+                for i, (_, username, karma) in enumerate(users)
+            ]
+        )
+
+        if all_people:
+            update.message.reply_text(
+                "Karma {}:\n{}".format(window_label(window), "\n".join(all_people))
+            )
+        else:
+            update.message.reply_text("No karma {}!".format(window_label(window)))
+        self.logger.info(
+            "{} wants to know the karmas {}!".format(
+                update.effective_user.first_name, window_label(window)
+            )
+        )
+
     def setkarma(self, update: Update, context: CallbackContext) -> None:
         if update.message.reply_to_message:
             user = update.message.reply_to_message.from_user
-            dbuser = get_user(self.table, user.id, update.message.chat.id)
             try:
                 _, qt, pas = update.message.text.split(" ")
                 qt = int(qt)
@@ -157,11 +234,21 @@ class Karma(Base):
                 return
             if pas != 3 * qt + 2:  # Waiting admin decorator
                 return
-            dbuser.karma += qt
-            dbuser.save()
+            self.ledger.add(update.message.chat.id, update.effective_user.id, user.id, qt)
             try:
                 update.message.delete()
             except BadRequest:
                 return
         else:
             return
+
+    def rebuild_karma(self, update: Update, context: CallbackContext) -> None:
+        """
+        Set the karma of the chat, or of all the chats with "all", back to the sum of the votes.
+        """
+        if ADMIN_ID not in (update.effective_user.id, update.message.chat.id):
+            return
+        chatid = None if context.args and context.args[0] == "all" else update.message.chat.id
+        num_users = self.ledger.rebuild(chatid)
+        update.message.reply_text("Karma rebuilt from the votes for {} users.".format(num_users))
+        self.logger.info("{} rebuilt the karma!".format(update.effective_user.first_name))
@@ -0,0 +1,174 @@
+"""
+Ledger of the karma votes, written in batches along with the karma totals.
+"""
+from collections import Counter
+import threading
+import time
+
+
+from peewee import chunked, fn
+
+
+from .helpers import get_user
+
+
+class KarmaLedger:
+    """
+    Append-only ledger of the karma votes, the karma of a user being the sum of the votes they got.
+
+    Votes wait in memory, and are written every `interval` seconds, as soon as `max_pending` votes
+    are waiting, and when the ledger is stopped. A write inserts the votes and adds them to the
+    totals with `karma = karma + ?` in the same transaction, so that the totals always match the
+    ledger, and the rest of the row is never written.
+    """
+
+    # Rows per insert, below the SQLite limit of 999 parameters
+    BATCH = 150
+
+    def __init__(
+        self, table, events, buffer=None, logger=None, interval=5, max_pending=100, rollups=None
+    ):
+        """
+        :param table: peewee.ModelBase, the users table.
+        :param events: peewee.ModelBase, the ledger table.
+        :param buffer: UserBuffer, whose rows are kept up to date with the karma.
+        :param logger: logging.getLogger, when using a logger.
+        :param interval: Seconds between two periodic writes.
+        :param max_pending: Number of waiting votes that triggers a write.
+        :param rollups: DailyRollups, written along with the votes.
+        """
+        self.table = table
+        self.events = events
+        self.buffer = buffer
+        self.logger = logger
+        self.interval = interval
+        self.max_pending = max_pending
+        self.rollups = rollups
+
+        self._pending = []
+        self._deltas = Counter()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def karma(self, userid, chatid):
+        """
+        :param userid: Telegram userid.
+        :param chatid: Telegram chatid.
+        :return: Karma of the user, including the votes not written yet.
+        """
+        with self._lock:
+            return get_user(self.table, userid, chatid).karma + self._deltas[(chatid, userid)]
+
+    def add(self, chatid, giver, receiver, delta):
+        """
+        Record a vote.
+        :param chatid: Telegram chatid.
+        :param giver: Telegram userid of the voter.
+        :param receiver: Telegram userid of the user getting the karma.
+        :param delta: Karma given, can be negative or 0.
+        :return: Karma of the receiver after the vote.
+        """
+        with self._lock:
+            self._pending.append(
+                {
+                    "chatid": chatid,
+                    "giver": giver,
+                    "receiver": receiver,
+                    "delta": delta,
+                    "timestamp": int(time.time()),
+                }
+            )
+            self._deltas[(chatid, receiver)] += delta
+            if self.rollups is not None:
+                self.rollups.add(chatid, receiver, karma=delta)
+            karma = self.karma(receiver, chatid)
+            if self.buffer is not None:
+                self.buffer.sync(receiver, chatid, karma=karma)
+            must_flush = len(self._pending) >= self.max_pending
+
+        if must_flush:
+            self.flush()
+        return karma
+
+    def flush(self):
+        """
+        Write the waiting votes and add them to the totals, in one transaction.
+        :return: Number of votes written.
+        """
+        table = self.table
+        with self._lock:
+            if not self._pending:
+                return 0
+
+            update_sql, _ = (
+                table.update({table.karma: table.karma + 0})
+                .where((table.chatid == 0) & (table.userid == 0))
+                .sql()
+            )
+            database = table._meta.database
+            with database.atomic():
+                for batch in chunked(self._pending, self.BATCH):
+                    self.events.insert_many(batch).execute()
+                database.cursor().executemany(
+                    update_sql,
+                    [
+                        (delta, chatid, userid)
+                        for (chatid, userid), delta in self._deltas.items()
+                        if delta
+                    ],
+                )
+                if self.rollups is not None:
+                    self.rollups.flush()
+            written = len(self._pending)
+            self._pending = []
+            self._deltas.clear()
+
+        return written
+
+    def rebuild(self, chatid=None):
+        """
+        Set the karma totals back to the sum of the ledger, e.g. after editing it by hand.
+        :param chatid: Telegram chatid, None for all the chats.
+        :return: Number of users updated.
+        """
+        table, events = self.table, self.events
+        total = events.select(fn.COALESCE(fn.SUM(events.delta), 0)).where(
+            (events.chatid == table.chatid) & (events.receiver == table.userid)
+        )
+        query = table.update({table.karma: total})
+        if chatid is not None:
+            query = query.where(table.chatid == chatid)
+
+        with self._lock:
+            self.flush()
+            if self.buffer is None:
+                return query.execute()
+            with self.buffer.bypass(chatid):  # Buffered rows get the new totals from the database
+                return query.execute()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error("Could not write the karma ledger: {}".format(e))
+
+    def start(self):
+        """
+        Start writing periodically in a background thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="KarmaLedger", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread and write what is left.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
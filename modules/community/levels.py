@@ -0,0 +1,111 @@
+"""
+Levels computation, with the experience thresholds computed once.
+"""
+import numpy as np
+
+
+MAX_LEVEL = 1000
+
+# Karma-independent part of the needed experience, `level ** 3.14`
+THRESHOLDS = [level ** 3.14 for level in range(MAX_LEVEL + 1)]
+THRESHOLDS_ARRAY = np.array(THRESHOLDS)
+
+
+def needed_exp(level, karma):
+    """
+    Number of messages to go past to leave a level.
+    :param level: Current level.
+    :param karma: Current karma, which lowers the needed experience.
+    :return: Int.
+    """
+    if level == 0:
+        return 0
+    # Dirty hack
+    if level == 1:
+        return 5
+    if level <= MAX_LEVEL:
+        threshold = THRESHOLDS[level]
+        return int(threshold * (1 - (karma / threshold)))
+    return int((level ** 3.14) * (1 - (karma / (level ** 3.14))))
+
+
+def get_level(num_messages, karma, level=0):
+    """
+    Level reached with that many messages and karma, never going below the current level.
+
+    Gives the same result as `while num_messages > needed_exp(level, karma): level += 1`, but
+    with a galloping then binary search over the thresholds, as they only grow from level 2
+    onwards.
+    :param num_messages: Number of messages.
+    :param karma: Karma.
+    :param level: Current level.
+    :return: Int.
+    """
+    while level < 2:
+        if num_messages <= needed_exp(level, karma):
+            return level
+        level += 1
+
+    if level >= MAX_LEVEL or num_messages > needed_exp(MAX_LEVEL, karma):
+        level = max(level, MAX_LEVEL)
+        while num_messages > needed_exp(level, karma):
+            level += 1
+        return level
+
+    # Galloping from the current level first, as it is usually the right one or close to it
+    low, high, step = level, level, 1
+    while num_messages > needed_exp(high, karma):
+        low = high + 1
+        high = min(high + step, MAX_LEVEL)
+        step *= 2
+
+    while low < high:
+        middle = (low + high) // 2
+        if num_messages > needed_exp(middle, karma):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def get_levels(num_messages, karma, levels=None):
+    """
+    Levels reached by many users at once, each the same as `get_level(n, k, level)`, so never
+    below the current level.
+
+    Runs the binary search of `get_level` on all the users at once, with the same float
+    operations so that the results are identical; the few users past MAX_LEVEL are left to
+    `get_level`.
+    :param num_messages: numpy.ndarray of ints, number of messages of each user.
+    :param karma: numpy.ndarray of ints, karma of each user.
+    :param levels: numpy.ndarray of ints, current level of each user, None to start from 0.
+    :return: numpy.ndarray of ints, level of each user.
+    """
+    num_messages = np.asarray(num_messages, dtype=np.int64)
+    karma = np.asarray(karma, dtype=np.int64)
+    if levels is None:
+        levels = np.zeros(num_messages.shape, dtype=np.int64)
+    levels = np.asarray(levels, dtype=np.int64)
+
+    # Thresholds only grow from level 2 onwards, levels 0 and 1 are special cases
+    low = np.clip(levels, 2, MAX_LEVEL)
+    high = np.full(num_messages.shape, MAX_LEVEL, dtype=np.int64)
+    searching = low < high
+    while searching.any():
+        middle = (low + high) // 2
+        threshold = THRESHOLDS_ARRAY[middle]
+        above = num_messages > np.trunc(threshold * (1 - (karma / threshold)))
+        low = np.where(searching & above, middle + 1, low)
+        high = np.where(searching & ~above, middle, high)
+        searching = low < high
+
+    result = np.where((levels <= 1) & (num_messages <= needed_exp(1, 0)), 1, low)
+    result = np.where((levels == 0) & (num_messages <= needed_exp(0, 0)), 0, result)
+
+    threshold = THRESHOLDS_ARRAY[MAX_LEVEL]
+    beyond = np.flatnonzero(
+        (num_messages > np.trunc(threshold * (1 - (karma / threshold)))) | (levels >= MAX_LEVEL)
+    )
+    for i in beyond:
+        result[i] = get_level(int(num_messages[i]), int(karma[i]), int(levels[i]))
+    return result
@@ -0,0 +1,82 @@
+"""
+Leaderboards shown one page at a time, with buttons to go through them.
+"""
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+DEFAULT_SIZE = 10
+MAX_SIZE = 50
+MAX_LENGTH = 4000  # Characters, under the 4096 of a message
+MAX_NAME = 32  # Characters of a name, longer ones are cut
+
+
+def page_size(num_people):
+    """
+    :param num_people: Number of people asked for, None if not given.
+    :return: Number of people per page.
+    """
+    if num_people is None or num_people < 1:
+        return DEFAULT_SIZE
+    return min(num_people, MAX_SIZE)
+
+
+def name(username, default):
+    """
+    :param username: First name of a user, None if not known yet.
+    :param default: Text instead of an unknown name.
+    :return: Name short enough for a leaderboard.
+    """
+    if not username:
+        return default
+    if len(username) > MAX_NAME:
+        return username[: MAX_NAME - 1] + "…"
+    return username
+
+
+def fit(lines):
+    """
+    :param lines: [String]
+    :return: The first lines, as many as fit in one message.
+    """
+    length = 0
+    for i, line in enumerate(lines):
+        length += len(line) + 1
+        if length > MAX_LENGTH:
+            return lines[:i]
+    return lines
+
+
+def keyboard(prefix, size, start, end, cursor):
+    """
+    :param prefix: Prefix of the callback data, telling which leaderboard it is.
+    :param size: Number of people per page.
+    :param start: Rank of the first user of the page, from 0.
+    :param end: Rank of the first user of the next page.
+    :param cursor: Tuple of ints, sort key of the last user of the page, None on the last page.
+    :return: InlineKeyboardMarkup, None if there is only one page.
+    """
+    buttons = []
+    if start > 0:
+        buttons.append(InlineKeyboardButton("Top", callback_data=callback_data(prefix, size, 0)))
+    if cursor is not None:
+        buttons.append(
+            InlineKeyboardButton("Next", callback_data=callback_data(prefix, size, end, cursor))
+        )
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+def callback_data(prefix, size, rank, cursor=()):
+    """
+    :return: String, e.g. "karma:10:20:5:1234", under the 64 bytes allowed by Telegram.
+    """
+    return ":".join(str(value) for value in (prefix, size, rank) + tuple(cursor))
+
+
+def parse(data):
+    """
+    :param data: String, see `callback_data`.
+    :return: (Number of people per page, rank of the first user, cursor or None for the top)
+    :raise ValueError: If the data is not from `callback_data`.
+    """
+    _, size, rank, *cursor = data.split(":")
+    return page_size(int(size)), int(rank), tuple(int(value) for value in cursor) or None
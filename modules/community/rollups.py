@@ -0,0 +1,145 @@
+"""
+Daily totals of messages and karma of each user, for leaderboards over a time window.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import threading
+
+
+from peewee import chunked, EXCLUDED, fn
+
+
+# Windows of the leaderboards, in days
+WINDOWS = {"today": 1, "day": 1, "week": 7, "month": 30, "year": 365}
+
+
+def today():
+    """
+    :return: datetime.date, current day in UTC, as the days of the rollups.
+    """
+    return datetime.now(timezone.utc).date()
+
+
+def parse_window(args):
+    """
+    Read the window and the number of people from the arguments of a leaderboard command, in any
+    order, e.g. "/karma week 5".
+    :param args: [String]
+    :return: (Name of the window, None for all time; number of people, None if not given)
+    """
+    window, num_people = None, None
+    for arg in args:
+        if arg.lower() in WINDOWS:
+            window = arg.lower()
+        else:
+            try:
+                num_people = int(arg)
+            except ValueError:
+                pass
+    return window, num_people
+
+
+def window_label(window):
+    """
+    :param window: Name of the window.
+    :return: String, e.g. "over the last 7 days".
+    """
+    days = WINDOWS[window]
+    return "today" if days == 1 else "over the last {} days".format(days)
+
+
+class DailyRollups:
+    """
+    Messages and karma of each user per (chat, day), kept up as they are recorded.
+
+    The increments wait in memory and are upserted when the user buffer or the karma ledger write
+    their own changes, in the same transaction.
+    """
+
+    # Rows per insert, below the SQLite limit of 999 parameters
+    BATCH = 150
+
+    def __init__(self, rollups, users):
+        """
+        :param rollups: peewee.ModelBase, the rollups table.
+        :param users: peewee.ModelBase, the users table, for their names.
+        """
+        self.rollups = rollups
+        self.users = users
+
+        self._pending = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, chatid, userid, day=None, messages=0, karma=0):
+        """
+        :param chatid: Telegram chatid.
+        :param userid: Telegram userid.
+        :param day: datetime.date, today (UTC) by default.
+        :param messages: Number of messages to add.
+        :param karma: Karma to add.
+        """
+        key = (chatid, userid, day or today())
+        with self._lock:
+            if messages:
+                self._pending[key + ("messages",)] += messages
+            if karma:
+                self._pending[key + ("karma",)] += karma
+
+    def flush(self):
+        """
+        Upsert the waiting increments, to be called within the transaction of the changes they come
+        with.
+        :return: Number of rows written.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+
+        rows = {}
+        for (chatid, userid, day, field), value in pending.items():
+            row = rows.setdefault(
+                (chatid, userid, day),
+                {"chatid": chatid, "userid": userid, "day": day, "messages": 0, "karma": 0},
+            )
+            row[field] += value
+
+        table = self.rollups
+        try:
+            for batch in chunked(list(rows.values()), self.BATCH):
+                table.insert_many(batch).on_conflict(
+                    conflict_target=[table.chatid, table.day, table.userid],
+                    update={
+                        table.messages: table.messages + EXCLUDED.messages,
+                        table.karma: table.karma + EXCLUDED.karma,
+                    },
+                ).execute()
+        except Exception:  # Kept for the next write
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return len(rows)
+
+    def top(self, chatid, field, days, limit):
+        """
+        Users with the highest total over the last days, from the rows of those days only.
+        :param chatid: Telegram chatid.
+        :param field: "messages" or "karma".
+        :param days: Number of days of the window, 1 for today.
+        :param limit: Maximum number of users.
+        :return: [(userid, first name, total)], highest first, without the users at 0.
+        """
+        rollups, users = self.rollups, self.users
+        total = fn.SUM(getattr(rollups, field))
+        since = today() - timedelta(days=days - 1)
+        query = (
+            rollups.select(rollups.userid, users.userfirstname, total)
+            .join(
+                users,
+                on=(users.userid == rollups.userid) & (users.chatid == rollups.chatid),
+            )
+            .where((rollups.chatid == chatid) & (rollups.day >= since))
+            .group_by(rollups.userid, users.userfirstname)
+            .having(total != 0)
+            .order_by(total.desc())
+            .limit(limit)
+        )
+        return list(query.tuples())
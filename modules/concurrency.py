@@ -0,0 +1,122 @@
+"""
+Concurrent update processing, keeping the updates of a chat in order.
+"""
+import queue
+import threading
+
+
+from telegram.ext import Handler
+
+
+class ChatHandler(Handler):
+    """
+    Handler checking updates like another one, but handling them through a ChatExecutor.
+    """
+
+    def __init__(self, handler, executor):
+        """
+        :param handler: telegram.ext.Handler, the wrapped handler.
+        :param executor: ChatExecutor
+        """
+        super().__init__(handler.callback)
+        self.handler = handler
+        self.executor = executor
+
+    def check_update(self, update):
+        return self.handler.check_update(update)
+
+    def handle_update(self, update, dispatcher, check_result, context=None):
+        self.executor.submit(
+            update,
+            lambda: self.handler.handle_update(update, dispatcher, check_result, context),
+        )
+
+
+class ChatExecutor:
+    """
+    Run the handlers on worker threads instead of the dispatcher thread.
+
+    Each chat always goes to the same worker, which handles its updates one after the other, so
+    that a slow handler only delays the chats sharing its worker. When a worker's queue is full,
+    the dispatcher waits for it. With the webhook, the queue of the WebhookServer then fills up
+    and Telegram is asked to send the updates again later; with polling, the Updater keeps
+    fetching updates into its own unbounded queue.
+    """
+
+    def __init__(self, dispatcher, logger=None, workers=8, queue_size=100):
+        """
+        :param dispatcher: telegram.ext.Dispatcher
+        :param logger: logging.getLogger, when using a logger.
+        :param workers: Number of worker threads.
+        :param queue_size: Maximum number of updates waiting for each worker.
+        """
+        self.dispatcher = dispatcher
+        self.logger = logger
+
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = []
+
+    def install(self):
+        """
+        Wrap all the handlers registered so far, to be called once all the modules are added.
+        """
+        for handlers in self.dispatcher.handlers.values():
+            handlers[:] = [ChatHandler(handler, self) for handler in handlers]
+
+    @staticmethod
+    def _chat(update):
+        """
+        :param update: telegram.Update
+        :return: Int, id of the chat (or user) the update belongs to.
+        """
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return 0
+
+    def submit(self, update, task):
+        """
+        Queue a task on the worker of the update's chat, waiting if that worker is too busy.
+        :param update: telegram.Update
+        :param task: Function without arguments.
+        """
+        tasks = self._queues[self._chat(update) % len(self._queues)]
+        try:
+            tasks.put_nowait((update, task))
+        except queue.Full:
+            if self.logger:
+                self.logger.warning("A worker is falling behind, waiting for it.")
+            tasks.put((update, task))
+
+    def start(self):
+        """
+        Start the workers.
+        """
+        for i, tasks in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._run, args=(tasks,), name="ChatExecutor-{}".format(i)
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop the workers once the queued updates are handled.
+        """
+        for tasks in self._queues:
+            tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self, tasks):
+        while True:
+            item = tasks.get()
+            if item is None:
+                break
+            update, task = item
+            try:
+                task()
+            except Exception as e:
+                self.dispatcher.dispatch_error(update, e)
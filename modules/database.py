@@ -0,0 +1,41 @@
+"""
+Database of the bot, built from its URL.
+"""
+from urllib.parse import parse_qsl, urlparse
+
+
+from playhouse.db_url import connect
+
+
+# Readers do not block the writer and the other way round, and waiting writers retry for a while
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,  # Milliseconds
+    "mmap_size": 256 * 1024 * 1024,  # Bytes
+    "cache_size": -64 * 1024,  # Kibibytes
+}
+
+
+def make_database(url, max_connections=32):
+    """
+    :param url: Database URL, see playhouse.db_url, e.g. "sqlite+pool:///databases/main.db".
+    Options in the query string (e.g. "?stale_timeout=300") are passed to the database, and take
+    precedence over the defaults below.
+    :param max_connections: Maximum number of connections, for the "+pool" backends.
+    :return: peewee.Database, connecting in each thread using it.
+    """
+    parsed = urlparse(url)
+    options = {}
+    if parsed.scheme.startswith("sqlite"):
+        options["pragmas"] = SQLITE_PRAGMAS
+        options["timeout"] = SQLITE_PRAGMAS["busy_timeout"] / 1000
+    if parsed.scheme.endswith("+pool"):
+        options["max_connections"] = max_connections
+        if parsed.scheme.startswith("sqlite"):  # A connection goes back to the pool to any thread
+            options["check_same_thread"] = False
+
+    for key, _ in parse_qsl(parsed.query):
+        options.pop(key, None)
+
+    return connect(url, **options)
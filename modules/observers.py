@@ -0,0 +1,88 @@
+"""
+Passive observers of the messages, all run by one handler.
+"""
+from collections import namedtuple
+import threading
+import time
+
+
+from telegram.ext import Filters, MessageHandler
+
+
+# What the observers usually need from an update, extracted once for all of them
+MessageView = namedtuple(
+    "MessageView", ["update", "message", "chatid", "userid", "firstname", "username", "text"]
+)
+
+
+class ObserverPipeline:
+    """
+    Run the observers, in order, on every message that is not a command.
+
+    An observer is a function taking a MessageView and the CallbackContext. An observer raising
+    does not prevent the next ones from running, and the time spent in each observer is kept.
+    """
+
+    # Observers should be fast, slower ones are logged
+    SLOW = 0.5
+
+    def __init__(self, logger=None, observers=None):
+        """
+        :param logger: logging.getLogger, when using a logger.
+        :param observers: [function], first observers.
+        """
+        self.logger = logger
+        self.observers = []
+        self.stats = {}
+        self._lock = threading.Lock()
+        for observer in observers or []:
+            self.add(observer)
+
+    def add(self, observer):
+        """
+        :param observer: function(MessageView, CallbackContext).
+        """
+        self.observers.append(observer)
+        self.stats[self._name(observer)] = {"calls": 0, "errors": 0, "seconds": 0.0}
+
+    @staticmethod
+    def _name(observer):
+        return getattr(observer, "__qualname__", repr(observer))
+
+    def handler(self):
+        """
+        :return: telegram.ext.MessageHandler running the pipeline, to be added in its own group.
+        """
+        return MessageHandler(Filters.update.message & ~Filters.command, self.run)
+
+    def run(self, update, context):
+        message = update.effective_message
+        user = update.effective_user
+        view = MessageView(
+            update,
+            message,
+            message.chat.id,
+            user.id if user else None,
+            user.first_name if user else None,
+            user.username if user else None,
+            message.text or message.caption or "",
+        )
+
+        for observer in self.observers:
+            stats = self.stats[self._name(observer)]
+            start = time.perf_counter()
+            try:
+                observer(view, context)
+            except Exception as e:
+                with self._lock:
+                    stats["errors"] += 1
+                if self.logger:
+                    self.logger.error("Observer {} failed: {!r}".format(self._name(observer), e))
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats["calls"] += 1
+                stats["seconds"] += elapsed
+            if elapsed > self.SLOW and self.logger:
+                self.logger.warning(
+                    "Observer {} took {:.2f} seconds.".format(self._name(observer), elapsed)
+                )
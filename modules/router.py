@@ -0,0 +1,108 @@
+"""
+Routing of the commands to their handler with one lookup, instead of asking every handler.
+"""
+from telegram import MessageEntity, Update
+from telegram.ext import CommandHandler, Handler
+
+
+def commands_help(handlers):
+    """
+    :param handlers: [telegram.ext.Handler], only the CommandHandlers are listed.
+    :return: Aliases and commands in text format.
+    """
+    return "".join(
+        "- {} => {};\n".format(", ".join(handler.command), handler.callback.__name__)
+        for handler in handlers
+        if isinstance(handler, CommandHandler)
+    )
+
+
+def commands_botfather(handlers):
+    """
+    :param handlers: [telegram.ext.Handler], only the CommandHandlers are listed.
+    :return: Aliases and commands but formatted for botfather.
+    """
+    return "".join(
+        "{} - {}\n".format(command, handler.callback.__name__)
+        for handler in handlers
+        if isinstance(handler, CommandHandler)
+        for command in handler.command
+    )
+
+
+class CommandRouter(Handler):
+    """
+    Single handler for all the registered CommandHandlers, finding the right one in a dict.
+    """
+
+    def __init__(self):
+        super().__init__(None)
+        self.handlers = []
+        self.commands = {}
+
+    def add(self, handler):
+        """
+        :param handler: telegram.ext.CommandHandler
+        :raise ValueError: If one of its aliases is already registered.
+        """
+        for command in handler.command:
+            if command in self.commands:
+                raise ValueError(
+                    "/{} is registered for both {} and {}.".format(
+                        command,
+                        self.commands[command].callback.__qualname__,
+                        handler.callback.__qualname__,
+                    )
+                )
+        for command in handler.command:
+            self.commands[command] = handler
+        self.handlers.append(handler)
+
+    def check_update(self, update):
+        """
+        Same as CommandHandler.check_update, for the handler registered for that command.
+        :param update: telegram.Update
+        :return: (CommandHandler, its check result), False if its filters refuse the update, None
+        if no handler is registered for that command.
+        """
+        if not isinstance(update, Update) or not update.effective_message:
+            return None
+
+        message = update.effective_message
+        if not (
+            message.entities
+            and message.entities[0].type == MessageEntity.BOT_COMMAND
+            and message.entities[0].offset == 0
+            and message.text
+            and message.bot
+        ):
+            return None
+
+        command, _, botname = message.text[1 : message.entities[0].length].partition("@")
+        if botname and botname.lower() != message.bot.username.lower():  # For another bot
+            return None
+
+        handler = self.commands.get(command.lower())
+        if handler is None:
+            return None
+
+        filter_result = handler.filters(update)
+        if not filter_result:
+            return False
+        return handler, (message.text.split()[1:], filter_result)
+
+    def handle_update(self, update, dispatcher, check_result, context=None):
+        handler, check_result = check_result
+        return handler.handle_update(update, dispatcher, check_result, context)
+
+    def get_commands(self):
+        """
+        :return: Aliases and commands of all the modules in text format.
+        """
+        return commands_help(self.handlers)
+
+    def get_commands_botfather(self):
+        """
+        :return: Aliases and commands of all the modules but formatted for botfather.
+        """
+        return commands_botfather(self.handlers)
@@ -0,0 +1,172 @@
+"""
+Brainfuck compiler and interpreter, for /brainfuck.
+"""
+import string
+
+
+from ..base import cpu_bound
+
+
+# Opcodes
+ADD, MOVE, CLEAR, OPEN, CLOSE, OUTPUT, INPUT, ERROR = range(8)
+
+# Output of each cell value, non-printable characters being shown as spaces
+OUTPUT_CHARS = [chr(value) if chr(value) in string.printable else " " for value in range(256)]
+
+
+class BrainfuckError(Exception):
+    """
+    Program that could not run until the end, with a message for the user.
+    """
+
+
+def _moves(commands):
+    """
+    Fold a run of moves, the pointer never going below 0.
+    :param commands: String of "<" and ">".
+    :return: (total, floor), the pointer ending at max(pointer + total, floor).
+    """
+    total, floor = 0, 0
+    for command in commands:
+        step = 1 if command == ">" else -1
+        total += step
+        floor = max(floor + step, 0)
+    return total, floor
+
+
+def compile_code(code):
+    """
+    Compile a program into a list of (opcode, argument).
+
+    Runs of "+-" and "<>" are folded into one op, "[-]" and "[+]" are folded into a clear op, and
+    brackets get the index of their matching bracket.
+
+    A "," without input uses the next character of the program as input, so that character is
+    compiled on its own and the "," skips it in that case. Unexpected characters and unmatched
+    brackets only fail when they are reached, like they used to.
+    :param code: String, the program.
+    :return: [(int, object)]
+    """
+    ops = []
+    brackets = []
+    alone = False  # Character right after a ",", which must stay a single op
+    position = 0
+    while position < len(code):
+        command = code[position]
+        end = position + 1
+        if not alone:
+            if command in "+-<>":
+                kind = "+-" if command in "+-" else "<>"
+                while end < len(code) and code[end] in kind:
+                    end += 1
+            elif code[position : position + 3] in ("[-]", "[+]"):
+                end = position + 3
+                command = "clear"
+        alone = False
+
+        if command in "+-":
+            delta = code.count("+", position, end) - code.count("-", position, end)
+            ops.append((ADD, delta % 256))
+        elif command in "<>":
+            ops.append((MOVE, _moves(code[position:end])))
+        elif command == "clear":
+            ops.append((CLEAR, None))
+        elif command == ".":
+            ops.append((OUTPUT, None))
+        elif command == ",":
+            if end < len(code):
+                ops.append((INPUT, ord(code[end]) % 256))
+                alone = True
+            else:
+                ops.append((INPUT, "Error at position {}: missing input.".format(position)))
+        elif command == "[":
+            brackets.append((len(ops), position))
+            ops.append((OPEN, None))
+        elif command == "]":
+            if brackets:
+                start, _ = brackets.pop()
+                ops[start] = (OPEN, len(ops))
+                ops.append((CLOSE, start))
+            else:
+                ops.append((ERROR, "Error at position {}: unmatched ].".format(position)))
+        else:
+            ops.append((ERROR, "Error at position {}: unexpected {}.".format(position, command)))
+        position = end
+
+    for start, position in brackets:
+        ops[start] = (OPEN, "Error at position {}: unmatched [.".format(position))
+
+    return ops
+
+
+def run(ops, inputs=None, max_steps=5_000_000):
+    """
+    Run a compiled program on a tape of wrapping bytes, the pointer never going below 0.
+    :param ops: Compiled program, see `compile_code`.
+    :param inputs: String, input of the program, or None.
+    :param max_steps: Maximum number of ops to run before giving up.
+    :return: String, the output of the program.
+    """
+    tape = bytearray(1)
+    pointer = 0
+    output = []
+    inputs = [ord(char) % 256 for char in reversed(inputs or "")]
+
+    end = len(ops)
+    index = 0
+    for _ in range(max_steps):
+        if index >= end:
+            return "".join(output)
+
+        opcode, argument = ops[index]
+        if opcode == ADD:
+            tape[pointer] = (tape[pointer] + argument) & 255
+        elif opcode == MOVE:
+            pointer = max(pointer + argument[0], argument[1])
+            if pointer >= len(tape):
+                tape.extend(bytes(pointer - len(tape) + 1))
+        elif opcode == CLOSE:
+            if tape[pointer]:
+                index = argument
+        elif opcode == OPEN:
+            if not tape[pointer]:
+                if isinstance(argument, str):
+                    raise BrainfuckError(argument)
+                index = argument
+        elif opcode == CLEAR:
+            tape[pointer] = 0
+        elif opcode == OUTPUT:
+            output.append(OUTPUT_CHARS[tape[pointer]])
+        elif opcode == INPUT:
+            if inputs:
+                tape[pointer] = inputs.pop()
+            elif isinstance(argument, str):
+                raise BrainfuckError(argument)
+            else:
+                # Here, we are cheating:
+                # We consider that the byte immediately next to the ',' instruction
+                # will be considered the input to be used.
+                tape[pointer] = argument
+                index += 1
+        else:  # ERROR
+            raise BrainfuckError(argument)
+
+        index += 1
+
+    if index >= end:
+        return "".join(output)
+    raise BrainfuckError("This is taking too much time :/")
+
+
+@cpu_bound(timeout=10)
+def interpret(code, inputs=None, max_steps=5_000_000):
+    """
+    :param code: String, the program.
+    :param inputs: String, input of the program, or None.
+    :param max_steps: Maximum number of ops to run before giving up.
+    :return: String, the output of the program or what went wrong, for the user.
+    """
+    try:
+        return "Interpreted: {}".format(run(compile_code(code), inputs, max_steps))
+    except BrainfuckError as e:
+        return str(e)
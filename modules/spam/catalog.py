@@ -0,0 +1,132 @@
+"""
+Index of the local media folders, to pick media without listing the folders on every request.
+"""
+from collections import namedtuple
+import hashlib
+import os
+import random
+import threading
+import time
+
+
+from PIL import Image, UnidentifiedImageError
+
+
+MediaEntry = namedtuple("MediaEntry", ["path", "mtime", "size", "width", "height", "hash"])
+
+
+def _describe(path, stat):
+    """
+    :param path: Path of the media.
+    :param stat: os.stat_result of the media.
+    :return: MediaEntry
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+    except (UnidentifiedImageError, OSError):  # Not a picture
+        width, height = None, None
+
+    return MediaEntry(path, stat.st_mtime, stat.st_size, width, height, digest.hexdigest())
+
+
+class MediaCatalog:
+    """
+    Index of some media folders, refreshed in the background, with a shuffle bag per chat.
+
+    A shuffle bag hands out every (distinct) media of a folder once before starting over, so that
+    the same picture does not come back twice in a row.
+    """
+
+    def __init__(self, root, folders, logger=None, interval=60):
+        """
+        :param root: Folder containing the indexed folders.
+        :param folders: [String], names of the folders to index.
+        :param logger: logging.getLogger, when using a logger.
+        :param interval: Seconds between two checks of the folders' mtime.
+        """
+        self.root = root
+        self.folders = folders
+        self.logger = logger
+        self.interval = interval
+
+        self._entries = {folder: {} for folder in folders}
+        self._paths = {folder: set() for folder in folders}
+        self._mtimes = {}
+        self._bags = {}
+        self._lock = threading.Lock()
+
+        self.refresh()
+        threading.Thread(target=self._run, name="MediaCatalog", daemon=True).start()
+
+    def _index(self, folder):
+        """
+        Index a folder again if it changed, only describing new or modified files.
+        :param folder: Name of the folder.
+        """
+        path = os.path.join(self.root, folder)
+        mtime = os.stat(path).st_mtime
+        if self._mtimes.get(folder) == mtime:
+            return
+
+        known = self._entries[folder]
+        entries = {}
+        for file in os.scandir(path):
+            if not file.is_file():
+                continue
+            stat = file.stat()
+            entry = known.get(file.name)
+            if not entry or entry.mtime != stat.st_mtime or entry.size != stat.st_size:
+                entry = _describe(file.path, stat)
+            entries[file.name] = entry
+
+        with self._lock:
+            self._entries[folder] = entries
+            self._paths[folder] = {entry.path for entry in entries.values()}
+        self._mtimes[folder] = mtime
+
+    def refresh(self):
+        """
+        Index again the folders that changed since the last refresh.
+        """
+        for folder in self.folders:
+            self._index(folder)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except OSError as e:
+                if self.logger:
+                    self.logger.error("Could not refresh the media catalog: {}".format(e))
+
+    def pick(self, folder, chatid):
+        """
+        Next media from the chat's shuffle bag for that folder.
+        :param folder: Name of the folder.
+        :param chatid: Telegram chatid.
+        :return: Path of the media, or None if the folder is empty.
+        """
+        key = (folder, chatid)
+        with self._lock:
+            bag = self._bags.get(key, [])
+            while bag:
+                path = bag.pop()
+                if path in self._paths[folder]:  # Else removed since the bag was filled
+                    return path
+
+            # One media per content, so that duplicated files do not come back more often
+            unique = {entry.hash: entry.path for entry in self._entries[folder].values()}
+            bag = list(unique.values())
+            if not bag:
+                return None
+            random.shuffle(bag)
+            path = bag.pop()
+            self._bags[key] = bag
+            return path
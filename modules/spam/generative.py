@@ -0,0 +1,118 @@
+"""
+Generative art, built as NumPy arrays in one pass and seeded with a stable hash of the userid.
+"""
+import hashlib
+
+
+from PIL import Image
+import numpy as np
+
+
+from ..base import cpu_bound, image_buffer
+
+
+# Bump when the output changes, so that cached images are generated again
+VERSION = 1
+
+VROUMBOT = "vroumbot"
+OUTPUT_SIZE = (512, 512)
+
+
+def _key(userid, person):
+    """
+    Stable 64-bit key for a user, unlike `hash()` which changes at every restart.
+    :param userid: Telegram userid.
+    :param person: Bytes, to get different keys for different generators.
+    :return: Int.
+    """
+    digest = hashlib.blake2b(str(userid).encode(), digest_size=8, person=person).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _mix(values):
+    """
+    SplitMix64 finalizer, to turn each uint64 into a well-spread one.
+    :param values: numpy.ndarray of uint64.
+    :return: numpy.ndarray of uint64.
+    """
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _alpha(bits):
+    """
+    :param bits: String of "0" and "1".
+    :return: numpy.ndarray of uint8, opaque for "1" and transparent for "0".
+    """
+    return np.array([255 if bit == "1" else 0 for bit in bits], dtype=np.uint8)
+
+
+def nft(userid):
+    """
+    64x64 NFT of a user, with the userid and "vroumbot" written in binary on the borders.
+    :param userid: Telegram userid.
+    :return: PIL.Image, upscaled to `OUTPUT_SIZE`.
+    """
+    key = np.uint64(_key(userid, b"nft"))
+    coordinates = np.arange(64, dtype=np.uint64)
+    ij = coordinates[:, None] * coordinates[None, :]
+    iju = ij * np.uint64(userid % (1 << 64))
+
+    pixels = np.empty((64, 64, 4), dtype=np.uint8)
+    pixels[..., 0] = _mix(key ^ iju) & np.uint64(0xFF)
+    pixels[..., 1] = _mix(key ^ ij ^ np.uint64(0x9E3779B97F4A7C15)) & np.uint64(0xFF)
+    pixels[..., 2] = _mix(key ^ iju ^ np.uint64(0x632BE59BD9B4E019)) & np.uint64(0xFF)
+    pixels[..., 3] = 255
+    pixels[(pixels[..., 0] == pixels[..., 1]) & (pixels[..., 1] == pixels[..., 2]), 3] = 0
+
+    binuserid = bin(userid)[2:].zfill(64)
+    binvroumbot = "".join(format(ord(x), "b").zfill(8) for x in VROUMBOT)
+    pixels[0, :, :3] = 0
+    pixels[0, :, 3] = _alpha(binuserid)
+    pixels[:, 0, :3] = 0
+    pixels[:, 0, 3] = _alpha(binvroumbot)
+
+    return Image.fromarray(pixels, "RGBA").resize(OUTPUT_SIZE, Image.NEAREST)
+
+
+def generative(userid, size):
+    """
+    Symmetric art piece of a user, with 3 random colours and black.
+    :param userid: Telegram userid.
+    :param size: Size of the piece before upscaling, between 8 and 512.
+    :return: PIL.Image, upscaled to `OUTPUT_SIZE`.
+    """
+    rng = np.random.default_rng(_key(userid, b"generative"))
+    palette = np.zeros((6, 4), dtype=np.uint8)
+    palette[:3, :3] = rng.integers(0, 256, size=(3, 3))
+    palette[:, 3] = 255
+
+    half = size // 2
+    pixels = np.zeros((size, size, 4), dtype=np.uint8)
+    pixels[..., 3] = 255
+    pixels[2 : size - 2, 2:half] = palette[rng.integers(0, 6, size=(size - 4, half - 2))]
+    pixels[2 : size - 2, size - half : size - 2] = pixels[2 : size - 2, 2:half][:, ::-1]
+
+    return Image.fromarray(pixels, "RGBA").resize(OUTPUT_SIZE, Image.NEAREST)
+
+
+@cpu_bound(timeout=10)
+def nft_png(userid):
+    """
+    :param userid: Telegram userid.
+    :return: Bytes, `nft` as PNG.
+    """
+    return image_buffer(nft(userid), "PNG", "nft.png").getvalue()
+
+
+@cpu_bound(timeout=10)
+def generative_png(userid, size):
+    """
+    :param userid: Telegram userid.
+    :param size: Size of the piece before upscaling, between 8 and 512.
+    :return: Bytes, `generative` as PNG.
+    """
+    return image_buffer(generative(userid, size), "PNG", "generative.png").getvalue()
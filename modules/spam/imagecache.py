@@ -0,0 +1,150 @@
+"""
+Bounded disk cache for generated images.
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+
+class ImageCache:
+    """
+    Content-addressed disk cache of generated images, evicting the least recently used ones.
+
+    Each image is stored under a hash of everything it depends on (see `key`). Accesses are appended
+    to an access log, which is replayed at startup to rebuild the in-memory LRU index, so that the
+    disk is only read to serve a hit.
+    """
+
+    LOG = "access.log"
+    SUFFIX = ".png"
+
+    def __init__(self, folder, max_bytes, logger=None):
+        """
+        :param folder: Folder of the cached images.
+        :param max_bytes: Budget of the cache; least recently used images are evicted above.
+        :param logger: logging.getLogger, when using a logger.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.logger = logger
+
+        self._index = OrderedDict()  # key: size, least recently used first
+        self._bytes = 0
+        self._log_lines = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(kind, params, userid, version):
+        """
+        :param kind: Name of the generator, e.g. "nft".
+        :param params: Tuple, parameters of the generator.
+        :param userid: Telegram userid.
+        :param version: Version of the generator.
+        :return: String, key of the image.
+        """
+        identity = repr((kind, tuple(params), userid, version)).encode()
+        return hashlib.blake2b(identity, digest_size=16).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + self.SUFFIX)
+
+    def _load(self):
+        """
+        Rebuild the index from the folder and the access log, then compact the log.
+        """
+        pattern = re.compile(r"[0-9a-f]{32}" + re.escape(self.SUFFIX))
+        files = [file for file in os.scandir(self.folder) if pattern.fullmatch(file.name)]
+        for file in sorted(files, key=lambda file: file.stat().st_mtime):
+            self._index[file.name[: -len(self.SUFFIX)]] = file.stat().st_size
+
+        try:
+            with open(os.path.join(self.folder, self.LOG), "r") as log:
+                for line in log:
+                    key = line.strip()
+                    if key in self._index:
+                        self._index.move_to_end(key)
+        except FileNotFoundError:
+            pass
+
+        self._bytes = sum(self._index.values())
+        self._compact()
+        self._evict()
+
+    def _compact(self):
+        """
+        Rewrite the access log with one line per cached image, in LRU order.
+        """
+        self._write(self.LOG, "".join("{}\n".format(key) for key in self._index).encode())
+        self._log_lines = len(self._index)
+
+    def _touch(self, key):
+        """
+        Mark an image as the most recently used one. Must hold the lock.
+        """
+        self._index.move_to_end(key)
+        with open(os.path.join(self.folder, self.LOG), "a") as log:
+            log.write("{}\n".format(key))
+        self._log_lines += 1
+        if self._log_lines > 4 * len(self._index) + 100:
+            self._compact()
+
+    def _evict(self):
+        """
+        Remove the least recently used images until the cache fits in its budget. Must hold the lock.
+        """
+        while self._bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _write(self, filename, data):
+        """
+        Write a file atomically, so that readers never see half of it.
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temporary, os.path.join(self.folder, filename))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def get(self, key):
+        """
+        :param key: Key of the image, see `key`.
+        :return: Bytes of the image, or None if not cached.
+        """
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._touch(key)
+
+        try:
+            with open(self._path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:  # Removed behind our back
+            with self._lock:
+                self._bytes -= self._index.pop(key, 0)
+            return None
+
+    def put(self, key, data):
+        """
+        :param key: Key of the image, see `key`.
+        :param data: Bytes of the image.
+        """
+        self._write(key + self.SUFFIX, data)
+        with self._lock:
+            self._bytes += len(data) - self._index.get(key, 0)
+            self._index[key] = len(data)
+            self._touch(key)
+            self._evict()
@@ -2,20 +2,19 @@
 Media spam! Yay!
 """
 from turtle import up
-from urllib.request import urlopen
-import html
-import json
-import os
 import random
 
 
-from PIL import Image
 from telegram import Update
 from telegram.ext import CallbackContext, CommandHandler
-import requests
 
 
 from ..base import Base
+from . import generative
+from .catalog import MediaCatalog
+from .imagecache import ImageCache
+from .prefetch import PrefetchPool
+from .xkcd import XkcdIndex
 
 
 class Media(Base):
@@ -23,6 +22,8 @@ class Media(Base):
     Media spam! Yay!
     """
 
+    GENERATED_CACHE_BYTES = 64 * 1024 * 1024
+
     def __init__(self, logger=None):
         commandhandlers = [
             CommandHandler(["cat", "chat", "kot"], self.random_cat),
@@ -46,6 +47,46 @@ class Media(Base):
             CommandHandler(["generative"], self.randompic),
         ]
         super().__init__(logger, commandhandlers, mediafolder="./media")
+        self.catalog = MediaCatalog(self._media(), ["cats", "brrou", "froj", "misty"], logger)
+        self.cat_pool = PrefetchPool("https://api.thecatapi.com/v1/images/search?limit=10", logger)
+        self.dog_pool = PrefetchPool("https://api.thedogapi.com/v1/images/search?limit=10", logger)
+        self.xkcd_index = XkcdIndex("./databases/xkcd.db", logger)
+        self.image_cache = ImageCache(self._media("nft"), self.GENERATED_CACHE_BYTES, logger)
+
+    def _cached_image(self, update, key, func, args, reply):
+        """
+        Reply with a generated image, generating it in the process pool if it is not cached.
+        :param update: telegram.Update
+        :param key: Key of the image in the cache.
+        :param func: CPU-bound function generating the image, see `generative`.
+        :param args: Tuple, arguments of `func`.
+        :param reply: Function replying with the bytes of the image.
+        """
+        photo = self.image_cache.get(key)
+        if photo is not None:
+            reply(photo)
+            return
+
+        def on_result(photo):
+            self.image_cache.put(key, photo)
+            reply(photo)
+
+        self._offload(update, func, args, on_result)
+
+    def _reply_picked(self, update, folder, caption):
+        """
+        Reply with the next photo of a folder of the catalog, or say that there is none.
+        :param update: telegram.Update
+        :param folder: Name of the folder.
+        :param caption: Caption of the photo.
+        """
+        filename = self.catalog.pick(folder, update.message.chat.id)
+        if filename is None:  # Empty folder, or all its files were removed
+            self.logger.warning("No media in the {} folder.".format(folder))
+            update.message.reply_text("No pic to show right now... ):")
+            return
+
+        self._send_media(update.message.reply_photo, "photo", filename, caption=caption)
 
     def random_cat(self, update: Update, context: CallbackContext) -> None:
         """
@@ -101,16 +142,11 @@ class Media(Base):
                 "مُواء",
             ]
         )
-        if random.randint(1, 6) > 3:
-            folder = self._media("cats")
-            filename = os.path.join(folder, random.choice(os.listdir(folder)))
-            with open(filename, "rb") as file:
-                update.message.reply_photo(photo=file, caption=meow)
+        url = None if random.randint(1, 6) > 3 else self.cat_pool.pop()
+        if url:
+            update.message.reply_photo(photo=url, caption=meow)
         else:
-            url = "https://api.thecatapi.com/v1/images/search"
-            response = urlopen(url)
-            data_json = json.loads(response.read())
-            update.message.reply_photo(photo=data_json[0]["url"], caption=meow)
+            self._reply_picked(update, "cats", meow)
 
         self.logger.info("{} wants a cat pic!".format(update.effective_user.first_name))
 
@@ -118,11 +154,8 @@ class Media(Base):
         """
         A very special cat.
         """
-        folder = self._media("brrou")
-        filename = os.path.join(folder, random.choice(os.listdir(folder)))
         meow = random.choice(["brrou", "Brrou", "b r r o u", "BROU", "B R R O U", "tut"])
-        with open(filename, "rb") as file:
-            update.message.reply_photo(photo=file, caption=meow)
+        self._reply_picked(update, "brrou", meow)
 
         self.logger.info("{} wants a Brrou pic!".format(update.effective_user.first_name))
 
@@ -130,11 +163,8 @@ class Media(Base):
         """
         FROJ
         """
-        folder = self._media("froj")
-        filename = os.path.join(folder, random.choice(os.listdir(folder)))
         meow = "https://frogdetective.net/"
-        with open(filename, "rb") as file:
-            update.message.reply_photo(photo=file, caption=meow)
+        self._reply_picked(update, "froj", meow)
 
         self.logger.info("{} wants a froj pic!".format(update.effective_user.first_name))
 
@@ -142,8 +172,7 @@ class Media(Base):
         """
         SPIN
         """
-        with open(self._media("spin.mp3"), "rb") as file:
-            update.message.reply_audio(audio=file)
+        self._send_media(update.message.reply_audio, "audio", self._media("spin.mp3"))
 
         self.logger.info("{} gets a SPEEN!".format(update.effective_user.first_name))
 
@@ -151,8 +180,7 @@ class Media(Base):
         """
         BONJOUR A TOUTES ET TOUT
         """
-        with open(self._media("setup.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("setup.mp4"))
 
         self.logger.info(
             "{} gets a bonjour à toutes et tous!".format(update.effective_user.first_name)
@@ -162,8 +190,7 @@ class Media(Base):
         """
         A little song for a little dumb
         """
-        with open(self._media("stupid.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("stupid.mp4"))
 
         self.logger.info(
             "{} is being really stupid right now!".format(update.effective_user.first_name)
@@ -173,8 +200,7 @@ class Media(Base):
         """
         HERESY TIME
         """
-        with open(self._media("heretic.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("heretic.mp4"))
 
         self.logger.info("{} likes being a heretic!".format(update.effective_user.first_name))
 
@@ -182,8 +208,7 @@ class Media(Base):
         """
         Best song
         """
-        with open(self._media("bricole.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("bricole.mp4"))
 
         self.logger.info("{} wants to BRICOLE!".format(update.effective_user.first_name))
 
@@ -191,8 +216,7 @@ class Media(Base):
         """
         A little song when someone gets trolled
         """
-        with open(self._media("troll.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("troll.mp4"))
 
         self.logger.info("{}'s just been trolled!".format(update.effective_user.first_name))
 
@@ -207,61 +231,20 @@ class Media(Base):
 
         userid = user.id
 
-        filename = os.path.join(self._media("nft"), "{}.png".format(userid))
-
-        if not os.path.isfile(filename):
-            binuserid = bin(userid)[2:].zfill(64)
-
-            vroumbot = "vroumbot"
-            binvroumbot = "".join(format(ord(x), "b").zfill(8) for x in vroumbot)
-
-            img = Image.new("RGBA", (64, 64), "black")
-            pixels = img.load()
-
-            def magic(i, j, userid):
-                ij = i * j
-                iju = i * j * userid
-                pix1 = hash(vroumbot[iju % len(vroumbot)] + str(iju)) % 256
-                pix2 = hash(vroumbot[iju % len(vroumbot)] + str(ij)) % 256
-                pix3 = hash(vroumbot[ij % len(vroumbot)] + str(iju)) % 256
-                transp = 255
-
-                if pix1 == pix2 == pix3:
-                    transp = 0
-
-                return (pix1, pix2, pix3, transp)
-
-            for i in range(img.size[0]):
-                for j in range(img.size[1]):
-                    pixels[i, j] = magic(i, j, userid)
-
-            for i, p in enumerate(binuserid):
-                if p == "1":
-                    pixels[i, 0] = (0, 0, 0, 255)
-                else:
-                    pixels[i, 0] = (0, 0, 0, 0)
-
-            for j, p in enumerate(binvroumbot):
-                if p == "1":
-                    pixels[0, j] = (0, 0, 0, 255)
-                else:
-                    pixels[0, j] = (0, 0, 0, 0)
-
-            img.resize((512, 512), Image.NEAREST).save(filename)
-
-        with open(filename, "rb") as file:
+        def reply(photo):
             update.message.reply_photo(
-                photo=file,
+                photo=photo,
                 caption="This is {}'s exclusive NFT, do not use without permission!".format(
                     user.first_name
                 ),
             )
 
-        self.logger.info("{} now has an NFT!".format(user.first_name))
+            self.logger.info("{} now has an NFT!".format(user.first_name))
 
-    def randompic(self, update: Update, context: CallbackContext) -> None:
-        import random
+        key = self.image_cache.key("nft", (), userid, generative.VERSION)
+        self._cached_image(update, key, generative.nft_png, (userid,), reply)
 
+    def randompic(self, update: Update, context: CallbackContext) -> None:
         """
         Your very own generative art piece!
         """
@@ -272,75 +255,46 @@ class Media(Base):
 
         userid = user.id
 
-        filename = os.path.join(self._media("nft"), "{}.png".format(userid))
-
-        if not os.path.isfile(filename):
-            random.seed(userid)
-            r_color = lambda: (
-                random.randint(0, 255),
-                random.randint(0, 255),
-                random.randint(0, 255),
-                int(255),
-            )
-            black = (0, 0, 0, 255)
-
-            colors = [r_color(), r_color(), r_color(), black, black, black]
-
-            binuserid = bin(userid)[2:].zfill(64)
-
-            vroumbot = "vroumbot"
-            binvroumbot = "".join(format(ord(x), "b").zfill(8) for x in vroumbot)
-
-            if len(context.args) >= 1:
-                img_size = context.args[0]
-            else:
-                img_size = 32
-
-            try:
-                img_size = int(img_size)
-                if img_size < 8:
-                    update.message.reply_text(
-                        "Don't toy with the bot! Enter a valid integer between 8 and 512"
-                    )
-                    return
-
-                if img_size > 512:
-                    update.message.reply_text(
-                        "Don't toy with the bot! Enter a valid integer between 8 and 512"
-                    )
-                    return
+        if len(context.args) >= 1:
+            img_size = context.args[0]
+        else:
+            img_size = 32
 
-            except:
+        try:
+            img_size = int(img_size)
+            if img_size < 8:
                 update.message.reply_text(
                     "Don't toy with the bot! Enter a valid integer between 8 and 512"
                 )
                 return
 
-            img = Image.new("RGBA", (img_size, img_size), "black")
-
-            pixels = img.load()
-
-            for i in range(2, img.size[0] // 2):
-                for j in range(2, img.size[1] - 2):
-                    c = random.choice(colors)
-                    pixels[i, j] = c
-                    pixels[img.size[0] - i - 1, j] = c
+            if img_size > 512:
+                update.message.reply_text(
+                    "Don't toy with the bot! Enter a valid integer between 8 and 512"
+                )
+                return
 
-            img.resize((512, 512), Image.NEAREST).save(filename)
+        except:
+            update.message.reply_text(
+                "Don't toy with the bot! Enter a valid integer between 8 and 512"
+            )
+            return
 
-        with open(filename, "rb") as file:
+        def reply(photo):
             update.message.reply_photo(
-                photo=file,
+                photo=photo,
                 caption="This is {}'s exclusive generative art piece".format(user.first_name),
             )
-        self.logger.info("{} now has an NFT!".format(user.first_name))
+            self.logger.info("{} now has an NFT!".format(user.first_name))
+
+        key = self.image_cache.key("generative", (img_size,), userid, generative.VERSION)
+        self._cached_image(update, key, generative.generative_png, (userid, img_size), reply)
 
     def pointeur(self, update: Update, context: CallbackContext) -> None:
         """
         Ici,on baise tous les pointeurs.
         """
-        with open(self._media("pointeur.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("pointeur.mp4"))
 
         self.logger.info("{} baise tous les pointeurs!".format(update.effective_user.first_name))
 
@@ -348,8 +302,7 @@ class Media(Base):
         """
         You are dumb in harmonic.
         """
-        with open(self._media("dumb.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("dumb.mp4"))
 
         self.logger.info("{} is calling someone dumb!".format(update.effective_user.first_name))
 
@@ -357,8 +310,7 @@ class Media(Base):
         """
         Sorry to calling you dumb in harmonic.
         """
-        with open(self._media("sorrydumb.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("sorrydumb.mp4"))
 
         self.logger.info(
             "{} is sorry for calling someone dumb!".format(update.effective_user.first_name)
@@ -417,10 +369,11 @@ class Media(Base):
                 "jappe jappe",
             ]
         )
-        url = "https://api.thedogapi.com/v1/images/search"
-        response = urlopen(url)
-        data_json = json.loads(response.read())
-        update.message.reply_photo(photo=data_json[0]["url"], caption=woof)
+        url = self.dog_pool.pop()
+        if url:
+            update.message.reply_photo(photo=url, caption=woof)
+        else:  # Better than nothing
+            self._reply_picked(update, "cats", woof)
 
         self.logger.info("{} wants a dog pic!".format(update.effective_user.first_name))
 
@@ -428,11 +381,8 @@ class Media(Base):
         """
         A very special dog.
         """
-        folder = self._media("misty")
-        filename = os.path.join(folder, random.choice(os.listdir(folder)))
         meow = random.choice(["misty", "Misty", "MISTY", "... Misty?", "Misty!", "Mistyyy"])
-        with open(filename, "rb") as file:
-            update.message.reply_photo(photo=file, caption=meow)
+        self._reply_picked(update, "misty", meow)
 
         self.logger.info("{} wants a Misty pic!".format(update.effective_user.first_name))
 
@@ -453,59 +403,31 @@ class Media(Base):
 
             # If number provided, selected comic
             if num:
-                try:
-                    url = "https://xkcd.com/{}/info.0.json".format(num)
-                    response = urlopen(url)
-                    data_json = json.loads(response.read())
-                    update.message.reply_photo(
-                        photo=data_json["img"],
-                        caption="XKCD #{}: {}\n\n{}".format(
-                            num, data_json["safe_title"], data_json["alt"]
-                        ),
-                    )
-                except:
+                comic = self.xkcd_index.get(num)
+                if not comic:
                     update.message.reply_text("This XKCD does not exists :/")
+                    return
             # If string provided, search
             else:
-                args_safe = html.escape(args)
-                try:
-                    url = "https://relevant-xkcd-backend.herokuapp.com/search"
-                    myobj = {"search": args_safe}
-                    response = requests.post(url, data=myobj)
-                    results = json.loads(response.text)["results"]
-                except:
-                    update.message.reply_text("An error has occured :/")
-                    return
+                results = self.xkcd_index.search(args)
                 text = 'Results for "{}" ({} found):\n'.format(args, len(results))
                 for result in results:
-                    text += "- {}: {} ({})\n".format(
-                        result["number"], result["title"], result["url"]
+                    text += "- {}: {} (https://xkcd.com/{}/)\n".format(
+                        result.num, result.title, result.num
                     )
                 update.message.reply_text(text, disable_web_page_preview=True)
+                return
         # No args == Random comic
         else:
-            url_last = "https://xkcd.com/info.0.json"
-            response = urlopen(url_last)
-            data_json = json.loads(response.read())
-            max = data_json["num"]
-            num = random.randint(1, max)
-
-            # We test for existence
-            ok = False
-            while not ok:
-                try:
-                    num = random.randint(1, max)
-                    url = "https://xkcd.com/{}/info.0.json".format(num)
-                    response = urlopen(url)
-                    data_json = json.loads(response.read())
-                    ok = True
-                except:
-                    ok = False
+            comic = self.xkcd_index.random()
+            if not comic:
+                update.message.reply_text("No XKCD yet, try again later :/")
+                return
 
-            update.message.reply_photo(
-                photo=data_json["img"],
-                caption="XKCD #{}: {}\n\n{}".format(num, data_json["safe_title"], data_json["alt"]),
-            )
+        update.message.reply_photo(
+            photo=comic.img,
+            caption="XKCD #{}: {}\n\n{}".format(comic.num, comic.safe_title, comic.alt),
+        )
 
         self.logger.info("{} wants some XKCD!".format(update.effective_user.first_name))
 
@@ -513,8 +435,7 @@ class Media(Base):
         """
         That's funny
         """
-        with open(self._media("funny.mp4"), "rb") as file:
-            update.message.reply_video(video=file)
+        self._send_media(update.message.reply_video, "video", self._media("funny.mp4"))
 
         self.logger.info("{}'s found something funny!".format(update.effective_user.first_name))
 
@@ -522,7 +443,10 @@ class Media(Base):
         """
         Good morning y'all!
         """
-        with open(self._media("gm.mp4"), "rb") as file:
-            update.message.reply_text("Good morning y'all!").reply_video(video=file)
+        self._send_media(
+            update.message.reply_text("Good morning y'all!").reply_video,
+            "video",
+            self._media("gm.mp4"),
+        )
 
         self.logger.info("{}'s says good morning y'all!".format(update.effective_user.first_name))
@@ -0,0 +1,87 @@
+"""
+Pools of random image URLs fetched ahead of time, so that handlers never wait on an API.
+"""
+from urllib.request import urlopen
+import json
+import queue
+import threading
+import time
+
+
+class PrefetchPool:
+    """
+    Bounded queue of ready image URLs from a thecatapi-like API, refilled in the background.
+
+    The API must answer with a JSON list of objects with an "url" key. The queue is refilled up to
+    `size` as soon as it goes below `low`, and a failing API is retried with an exponential backoff.
+    """
+
+    def __init__(self, url, logger=None, size=10, low=3, timeout=5, max_backoff=300):
+        """
+        :param url: API endpoint.
+        :param logger: logging.getLogger, when using a logger.
+        :param size: Maximum number of URLs kept ready.
+        :param low: Number of URLs below which the queue is refilled.
+        :param timeout: Seconds before giving up on a request.
+        :param max_backoff: Maximum seconds between two attempts on a failing API.
+        """
+        self.url = url
+        self.logger = logger
+        self.low = low
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+
+        self._urls = queue.Queue(maxsize=size)
+        self._wanted = threading.Event()
+        self._wanted.set()
+        threading.Thread(target=self._run, name="PrefetchPool", daemon=True).start()
+
+    def pop(self):
+        """
+        :return: A ready image URL, or None if there is none right now.
+        """
+        try:
+            url = self._urls.get_nowait()
+        except queue.Empty:
+            url = None
+
+        if self._urls.qsize() < self.low:
+            self._wanted.set()
+
+        return url
+
+    def _fetch(self):
+        """
+        :return: [String], image URLs from one API call.
+        """
+        with urlopen(self.url, timeout=self.timeout) as response:
+            return [image["url"] for image in json.loads(response.read())]
+
+    def _fill(self):
+        """
+        Call the API until the queue is full.
+        """
+        while not self._urls.full():
+            urls = self._fetch()
+            if not urls:
+                return
+            for url in urls:
+                try:
+                    self._urls.put_nowait(url)
+                except queue.Full:
+                    return
+
+    def _run(self):
+        backoff = 1
+        while True:
+            self._wanted.wait()
+            self._wanted.clear()
+            try:
+                self._fill()
+                backoff = 1
+            except Exception as e:  # Anything left uncaught would end the thread
+                if self.logger:
+                    self.logger.warning("Could not prefetch from {}: {}".format(self.url, e))
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                self._wanted.set()
@@ -6,11 +6,12 @@ import random
 
 from bs4 import BeautifulSoup
 from telegram import Update
-from telegram.ext import CallbackContext, CommandHandler, Filters, MessageHandler
+from telegram.ext import CallbackContext, CommandHandler
 import requests
 
 
 from ..base import Base
+from ..observers import MessageView
 
 
 class PrivateJoke(Base):
@@ -25,7 +26,6 @@ class PrivateJoke(Base):
             CommandHandler(["whois", "whoissciper", "sciper"], self.whoissciper),
             CommandHandler(["whoisnsfw", "whoisscipernsfw", "scipernsfw"], self.whoisscipernsfw),
             CommandHandler(["genre", "gender", "sexe", "sex", "sexx", "genr"], self.gender),
-            MessageHandler(~Filters.command, self.carpe),
             CommandHandler(["saisine", "ccg"], self.saisine),
             CommandHandler(["horny"], self.horny),
             CommandHandler(["crypto", "bully"], self.crypto),
@@ -34,7 +34,7 @@ class PrivateJoke(Base):
             ),
             CommandHandler(["motiondordre"], self.motiondordre),
         ]
-        super().__init__(logger, commandhandlers, mediafolder="./media")
+        super().__init__(logger, commandhandlers, mediafolder="./media", observers=[self.carpe])
 
     def toutoutoutou(self, update: Update, context: CallbackContext) -> None:
         """
@@ -50,10 +50,9 @@ class PrivateJoke(Base):
         """
         Actual rythm growing.
         """
-        with open(self._media("toutoutoutou.m4a"), "rb") as file:
-            update.message.reply_audio(audio=file).reply_sticker(
-                "CAACAgIAAxkBAAECenJg1f163I_8Uzc9UjymlOLV9yyxWAACywADwPsIAAEtUj0YdWOU7iAE"
-            )
+        self._send_media(
+            update.message.reply_audio, "audio", self._media("toutoutoutou.m4a")
+        ).reply_sticker("CAACAgIAAxkBAAECenJg1f163I_8Uzc9UjymlOLV9yyxWAACywADwPsIAAEtUj0YdWOU7iAE")
 
         self.logger.info("{} gets a toutoutoutou!".format(update.effective_user.first_name))
 
@@ -140,22 +139,20 @@ class PrivateJoke(Base):
 
         self.logger.info("{} got gendered!".format(update.effective_user.first_name))
 
-    def carpe(self, update: Update, context: CallbackContext) -> None:
+    def carpe(self, view: MessageView, context: CallbackContext) -> None:
         """
         Because no one likes him.
         """
-        if update.effective_user.username == "ReallyCrazyMan" and random.randint(1, 6) == 6:
-            with open(self._media("opinion.jpg"), "rb") as file:
-                update.message.reply_photo(photo=file)
+        if view.username == "ReallyCrazyMan" and random.randint(1, 6) == 6:
+            self._send_media(view.message.reply_photo, "photo", self._media("opinion.jpg"))
 
-            self.logger.info("{} said ew!".format(update.effective_user.first_name))
+            self.logger.info("{} said ew!".format(view.firstname))
 
     def saisine(self, update: Update, context: CallbackContext) -> None:
         """
         The storm is approaching...
         """
-        with open(self._media("saisine.mp3"), "rb") as file:
-            update.message.reply_audio(audio=file)
+        self._send_media(update.message.reply_audio, "audio", self._media("saisine.mp3"))
 
         self.logger.info("{} gets a SAISINE!".format(update.effective_user.first_name))
 
@@ -181,8 +178,9 @@ class PrivateJoke(Base):
         """
         It is a statement.
         """
-        with open(self._media("tiktok.jpg"), "rb") as file:
-            update.message.reply_photo(photo=file, caption="choquer decu")
+        self._send_media(
+            update.message.reply_photo, "photo", self._media("tiktok.jpg"), caption="choquer decu"
+        )
 
         self.logger.info(
             "{} is asking for cammonte's TikTok!".format(update.effective_user.first_name)
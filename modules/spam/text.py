@@ -2,9 +2,7 @@
 Text spam! Yay!
 """
 from time import sleep
-import datetime
 import random
-import string
 
 
 from telegram import Update
@@ -13,6 +11,7 @@ import requests
 
 
 from ..base import Base
+from . import brainfuck
 
 
 class Text(Base):
@@ -20,6 +19,8 @@ class Text(Base):
     Text spam! Yay!
     """
 
+    BRAINFUCK_MAX_STEPS = 5_000_000
+
     def __init__(self, logger=None):
         commandhandlers = [
             CommandHandler("vroum", self.vroum),
@@ -280,9 +281,6 @@ class Text(Base):
         )
 
     def brainfuck(self, update: Update, context: CallbackContext) -> None:
-        max_cell_value = 255
-        do_wrapping = True
-
         if not len(context.args) or len(context.args) > 2:
             update.message.reply_text("Usage: /brainfuck code [input]")
             return
@@ -291,76 +289,11 @@ class Text(Base):
             inputs = None
         else:  # == 2
             instr = context.args[0]
-            inputs = list(context.args[1])
-
-        data, data_ptr, instr_ptr = [0], 0, 0
-        result = ""
-
-        time_start = datetime.datetime.now()
-        while instr_ptr < len(instr):
-            command = instr[instr_ptr]
-
-            if command == ">":
-                data_ptr += 1
-                if data_ptr == len(data):
-                    data.append(0)
-            elif command == "<":
-                data_ptr -= 1
-                if data_ptr < 0:
-                    data_ptr = 0
-            elif command == "+":
-                data[data_ptr] += 1
-                if data[data_ptr] > max_cell_value:
-                    if do_wrapping:
-                        data[data_ptr] = 0
-                    else:
-                        data[data_ptr] = max_cell_value
-            elif command == "-":
-                data[data_ptr] -= 1
-                if data[data_ptr] < 0:
-                    if do_wrapping:
-                        data[data_ptr] = max_cell_value
-                    else:
-                        data[data_ptr] = 0
-            elif command == ".":
-                if chr(data[data_ptr]) not in string.printable:  # Gross flemme
-                    result += " "
-                else:
-                    result += chr(data[data_ptr])
-            elif command == ",":
-                if inputs:
-                    data[data_ptr] = ord(inputs.pop(0))
-                else:
-                    # Here, we are cheating:
-                    # We consider that the byte immediately next to the ',' instruction
-                    # will be considered the input to be used.
-                    instr_ptr += 1
-                    data[data_ptr] = ord(instr[instr_ptr])
-            elif command == "[":
-                if data[data_ptr] == 0:
-                    braces = 1
-                    while braces > 0:
-                        instr_ptr += 1
-                        if instr[instr_ptr] == "[":
-                            braces += 1
-                        elif instr[instr_ptr] == "]":
-                            braces -= 1
-            elif command == "]":
-                braces = 1
-                while braces > 0:
-                    instr_ptr -= 1
-                    if instr[instr_ptr] == "[":
-                        braces -= 1
-                    elif instr[instr_ptr] == "]":
-                        braces += 1
-                instr_ptr -= 1
-            else:
-                update.message.reply_text(f"Error at position {instr_ptr}: unexpected {command}.")
-                return
+            inputs = context.args[1]
 
-            instr_ptr += 1
-            if datetime.datetime.now() - time_start > datetime.timedelta(seconds=1):
-                update.message.reply_text(f"This is taking too much time :/")
-                return
-
-        update.message.reply_text(f"Interpreted: {result}")
+        self._offload(
+            update,
+            brainfuck.interpret,
+            (instr, inputs, self.BRAINFUCK_MAX_STEPS),
+            update.message.reply_text,
+        )
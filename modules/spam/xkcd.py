@@ -0,0 +1,194 @@
+"""
+Local index of the xkcd comics, to answer /xkcd without going through the network.
+"""
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import json
+import random
+import threading
+import time
+
+
+from peewee import IntegerField, Model, TextField
+from playhouse.sqlite_ext import FTS5Model, RowIDField, SearchField, SqliteExtDatabase
+
+
+class Comic(Model):
+    """
+    Metadata of a comic, as given by https://xkcd.com/<num>/info.0.json.
+    """
+
+    num = IntegerField(primary_key=True)
+    title = TextField()
+    safe_title = TextField()
+    alt = TextField()
+    transcript = TextField()
+    img = TextField()
+
+
+class ComicIndex(FTS5Model):
+    """
+    Full-text index of the comics, with the comic number as rowid.
+    """
+
+    rowid = RowIDField()
+    title = SearchField()
+    safe_title = SearchField()
+    alt = SearchField()
+    transcript = SearchField()
+
+    class Meta:
+        """
+        Stemming, so that "compiling" finds "compile".
+        """
+
+        options = {"tokenize": "porter unicode61"}
+
+
+class XkcdIndex:
+    """
+    Local index of the xkcd comics, synchronised in the background.
+    """
+
+    URL = "https://xkcd.com/{}info.0.json"
+
+    def __init__(self, path, logger=None, interval=6 * 60 * 60, timeout=10):
+        """
+        :param path: Path of the SQLite database of the index.
+        :param logger: logging.getLogger, when using a logger.
+        :param interval: Seconds between two synchronisations, or None to never synchronise.
+        :param timeout: Seconds before giving up on a request.
+        """
+        self.logger = logger
+        self.interval = interval
+        self.timeout = timeout
+
+        self.database = SqliteExtDatabase(path)
+        self.database.bind([Comic, ComicIndex])
+        self.database.create_tables([Comic, ComicIndex])
+
+        if interval:
+            threading.Thread(target=self._run, name="XkcdIndex", daemon=True).start()
+
+    def add(self, comics):
+        """
+        Add or replace comics in the index.
+        :param comics: [dict], comics as given by the xkcd JSON API.
+        """
+        rows = [
+            {
+                "num": comic["num"],
+                "title": comic.get("title", ""),
+                "safe_title": comic.get("safe_title", ""),
+                "alt": comic.get("alt", ""),
+                "transcript": comic.get("transcript", ""),
+                "img": comic.get("img", ""),
+            }
+            for comic in comics
+        ]
+        with self.database.atomic():
+            for row in rows:
+                Comic.replace(**row).execute()
+                ComicIndex.delete().where(ComicIndex.rowid == row["num"]).execute()
+                ComicIndex.insert(
+                    rowid=row["num"],
+                    title=row["title"],
+                    safe_title=row["safe_title"],
+                    alt=row["alt"],
+                    transcript=row["transcript"],
+                ).execute()
+
+    def load_dump(self, path):
+        """
+        Fill the index from a JSON file with a list of comics, e.g. to build it offline.
+        :param path: Path of the dump.
+        """
+        with open(path, "r") as file:
+            self.add(json.load(file))
+
+    def latest(self):
+        """
+        :return: Number of the most recent comic in the index, 0 if empty.
+        """
+        return Comic.select(Comic.num).order_by(Comic.num.desc()).scalar() or 0
+
+    def get(self, num):
+        """
+        :param num: Number of the comic.
+        :return: Comic, or None if not in the index.
+        """
+        return Comic.get_or_none(Comic.num == num)
+
+    def random(self):
+        """
+        :return: A random Comic, or None if the index is empty.
+        """
+        latest = self.latest()
+        if not latest:
+            return None
+        num = random.randint(1, latest)
+        return Comic.select().where(Comic.num >= num).order_by(Comic.num).first()
+
+    def search(self, words, limit=10):
+        """
+        Full-text search over the titles, alt texts and transcripts, best matches first.
+        :param words: String, words to look for.
+        :param limit: Maximum number of results.
+        :return: [Comic]
+        """
+        terms = ['"{}"'.format(word.replace('"', '""')) for word in words.split()]
+        if not terms:
+            return []
+        return list(
+            Comic.select()
+            .join(ComicIndex, on=(Comic.num == ComicIndex.rowid))
+            .where(ComicIndex.match(" OR ".join(terms)))
+            .order_by(ComicIndex.bm25())
+            .limit(limit)
+        )
+
+    def _fetch(self, num=None):
+        """
+        :param num: Number of the comic, or None for the most recent one.
+        :return: dict, comic as given by the xkcd JSON API.
+        """
+        url = self.URL.format("{}/".format(num) if num else "")
+        with urlopen(url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def sync(self, batch=50):
+        """
+        Fetch the comics more recent than the most recent one in the index.
+        :param batch: Number of comics to fetch before writing them.
+        :return: Number of comics added.
+        """
+        latest = self._fetch()["num"]
+        comics = []
+        added = 0
+        try:
+            for num in range(self.latest() + 1, latest + 1):
+                try:
+                    comics.append(self._fetch(num))
+                except HTTPError as e:
+                    if e.code != 404:  # Relevant xkcd: https://xkcd.com/404/
+                        raise
+                if len(comics) >= batch or num == latest:
+                    self.add(comics)
+                    added += len(comics)
+                    comics = []
+        except Exception:  # Keep the comics already fetched, the next sync goes on from there
+            self.add(comics)
+            raise
+
+        return added
+
+    def _run(self):
+        while True:
+            try:
+                added = self.sync()
+                if added and self.logger:
+                    self.logger.info("{} new XKCD indexed!".format(added))
+            except (OSError, ValueError, KeyError) as e:
+                if self.logger:
+                    self.logger.warning("Could not synchronise the XKCD index: {}".format(e))
+            time.sleep(self.interval)
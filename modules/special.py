@@ -1,13 +1,31 @@
 """
 Basic Telegram information and administration.
 """
+import os
+
+
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import CallbackContext, CommandHandler
 
 
+from secret import ADMIN_ID
+
+
 from .base import Base
 
 
+media_kinds = {
+    ".jpg": "photo",
+    ".jpeg": "photo",
+    ".png": "photo",
+    ".mp4": "video",
+    ".mp3": "audio",
+    ".m4a": "audio",
+    ".gif": "animation",
+}
+
+
 class Special(Base):
     """
     Basic Telegram information and administration.
@@ -18,8 +36,9 @@ class Special(Base):
             CommandHandler(["userid", "id"], self.userid),
             CommandHandler(["chatid", "here"], self.chatid),
             CommandHandler(["messageid", "this", "that"], self.messageid),
+            CommandHandler(["warmup"], self.warmup),
         ]
-        super().__init__(logger, commandhandlers)
+        super().__init__(logger, commandhandlers, mediafolder="./media")
 
     def userid(self, update: Update, context: CallbackContext) -> None:
         """
@@ -64,3 +83,40 @@ class Special(Base):
                     update.message.chat.id,
                 )
             )
+
+    def warmup(self, update: Update, context: CallbackContext) -> None:
+        """
+        Upload all the media to the admin chat, so that later sends only use their file_id.
+        """
+        if ADMIN_ID not in (update.effective_user.id, update.message.chat.id):
+            return
+
+        uploaded, cached, failed = 0, 0, 0
+        for root, folders, filenames in os.walk(self._media()):
+            # Templates and generated images are never sent as is
+            folders[:] = [folder for folder in folders if folder not in ("exp", "nft")]
+            for filename in sorted(filenames):
+                kind = media_kinds.get(os.path.splitext(filename)[1].lower())
+                if not kind:
+                    continue
+                path = os.path.normpath(os.path.join(root, filename))
+                if self._get_file_id(path, os.stat(path)):
+                    cached += 1
+                    continue
+                try:
+                    self._send_media(
+                        getattr(context.bot, "send_{}".format(kind)),
+                        kind,
+                        path,
+                        chat_id=ADMIN_ID,
+                        disable_notification=True,
+                    )
+                    uploaded += 1
+                except TelegramError:
+                    failed += 1
+
+        update.message.reply_text(
+            "{} media uploaded, {} already cached, {} failed.".format(uploaded, cached, failed)
+        )
+
+        self.logger.info("{} warmed the media up!".format(update.effective_user.first_name))
@@ -0,0 +1,161 @@
+"""
+Webhook mode, where Telegram sends the updates to us instead of us polling for them.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import hmac
+import json
+import queue
+import signal
+import threading
+
+
+from telegram import Update
+
+
+# Tells the dispatching thread to stop, as nothing received can be it
+_STOP = object()
+
+
+class WebhookServer:
+    """
+    Local HTTP listener for the updates sent by Telegram, usually behind a reverse proxy.
+
+    Requests must carry the secret token given to Telegram when setting the webhook. Updates wait
+    in a bounded queue for the dispatcher; when it is full, Telegram is answered 503 and sends the
+    update again later.
+    """
+
+    SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+    def __init__(
+        self,
+        dispatcher,
+        url,
+        secret_token,
+        listen="127.0.0.1",
+        port=8443,
+        logger=None,
+        queue_size=100,
+    ):
+        """
+        :param dispatcher: telegram.ext.Dispatcher
+        :param url: Public URL of the webhook, whose path is the one listened to.
+        :param secret_token: Secret token expected from Telegram.
+        :param listen: Address to listen to.
+        :param port: Port to listen to.
+        :param logger: logging.getLogger, when using a logger.
+        :param queue_size: Maximum number of updates waiting for the dispatcher.
+        """
+        self.dispatcher = dispatcher
+        self.url = url
+        self.path = urlparse(url).path or "/"
+        self.secret_token = secret_token
+        self.logger = logger
+
+        self._updates = queue.Queue(maxsize=queue_size)
+        self._server = ThreadingHTTPServer((listen, port), self._request_handler())
+        self._server.daemon_threads = True
+        self._threads = []
+
+    def _request_handler(self):
+        """
+        :return: BaseHTTPRequestHandler subclass answering for this server.
+        """
+        webhook = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.send_response(webhook.receive(self.path, self.headers, self._body()))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def log_message(self, format, *args):  # Not every request in the logs
+                pass
+
+        return RequestHandler
+
+    def receive(self, path, headers, body):
+        """
+        :param path: Path of the request.
+        :param headers: Headers of the request.
+        :param body: Bytes, body of the request.
+        :return: HTTP status code of the answer.
+        """
+        if path != self.path:
+            return 404
+        token = headers.get(self.SECRET_HEADER) or ""
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return 403
+
+        try:
+            data = json.loads(body)
+            update = Update.de_json(data, self.dispatcher.bot) if isinstance(data, dict) else None
+        except Exception:  # Whatever the body is, it is not an update
+            update = None
+        if update is None:
+            return 400
+
+        try:
+            self._updates.put_nowait(update)
+        except queue.Full:
+            if self.logger:
+                self.logger.warning("Too many waiting updates, asking Telegram to retry.")
+            return 503
+        return 200
+
+    def start(self, drop_pending_updates=False):
+        """
+        Start listening, then tell Telegram to send the updates here.
+        :param drop_pending_updates: Drop the updates Telegram has kept for us.
+        """
+        for target, name in ((self._server.serve_forever, "server"), (self._run, "dispatcher")):
+            thread = threading.Thread(target=target, name="WebhookServer-{}".format(name))
+            thread.start()
+            self._threads.append(thread)
+
+        self.dispatcher.bot.set_webhook(
+            self.url,
+            drop_pending_updates=drop_pending_updates,
+            api_kwargs={"secret_token": self.secret_token},
+        )
+
+    def stop(self):
+        """
+        Stop listening, and dispatch the updates already received.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._updates.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def idle(self, stop_signals=(signal.SIGINT, signal.SIGTERM, signal.SIGABRT)):
+        """
+        Block until one of the signals is received, then stop, like `Updater.idle` for polling.
+        :param stop_signals: Signals stopping the server.
+        """
+        stopping = threading.Event()
+        for stop_signal in stop_signals:
+            signal.signal(stop_signal, lambda signum, frame: stopping.set())
+        while not stopping.wait(1):
+            pass
+
+        if self.logger:
+            self.logger.info("Stopping the webhook...")
+        self.stop()
+
+    def _run(self):
+        while True:
+            update = self._updates.get()
+            if update is _STOP:
+                break
+            try:
+                self.dispatcher.process_update(update)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error("Could not dispatch an update: {}".format(e))
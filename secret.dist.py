@@ -1,5 +1,7 @@
 TOKEN = "your_token"
 
+DATABASE_URL = "sqlite+pool:///databases/main.db"
+
 ADMIN_ID = 42
 BOT_ID = int(TOKEN.split(":")[0])
 
@@ -8,3 +10,15 @@ TRELLO_API_SECRET = "token"
 TRELLO_FEEDBACK_BOARD = "name of the board"
 TRELLO_FEEDBACK_LIST = "name of the list in the board"
 TRELLO_LINK = "link to the trello"
+
+CHAT_WORKERS = 8
+CHAT_QUEUE_SIZE = 100
+
+# Seconds after which the commands sent while the bot was down are dropped
+CATCHUP_MAX_AGE = 5 * 60
+
+# None to poll for the updates
+WEBHOOK_URL = None  # e.g. "https://example.com/vroumbot"
+WEBHOOK_SECRET = "random string"
+WEBHOOK_LISTEN = "127.0.0.1"
+WEBHOOK_PORT = 8443
@@ -0,0 +1,9 @@
+"""
+Tests run from the repo folder with `python -m pytest tests`, the modules being imported as the bot
+does.
+"""
+import os
+import sys
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
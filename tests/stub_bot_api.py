@@ -0,0 +1,146 @@
+"""
+Local stand-in for the Telegram Bot API, for the tests and the benchmarks.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+import json
+import queue
+import threading
+import time
+
+
+TOKEN = "123456:ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghi"
+BOT = {"id": 123456, "is_bot": True, "first_name": "vroumbot", "username": "vroumbot"}
+
+
+class StubBotAPI:
+    """
+    Answers the few methods the bot uses, keeps the updates for getUpdates or sends them to a
+    webhook, and records the messages sent.
+
+    `latency` seconds are waited before each answer and each webhook request, as a network would.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = queue.Queue()  # (time received, sendMessage parameters)
+        self.webhook = None  # (URL to send the updates to, secret token)
+
+        self._updates = []
+        self._new_update = threading.Condition()
+        self._deliveries = queue.Queue()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._request_handler())
+        self._server.daemon_threads = True
+        for target in (self._server.serve_forever, self._deliver):
+            threading.Thread(target=target, daemon=True).start()
+
+    @property
+    def base_url(self):
+        """
+        :return: Base URL to give to telegram.ext.Updater, the token being appended to it.
+        """
+        return "http://127.0.0.1:{}/bot".format(self._server.server_address[1])
+
+    def push(self, update):
+        """
+        Make an update available, as Telegram does when something happens.
+        :param update: Dict, the update.
+        """
+        if self.webhook is None:
+            with self._new_update:
+                self._updates.append(update)
+                self._new_update.notify_all()
+        else:
+            self._deliveries.put(update)
+
+    def close(self):
+        self._deliveries.put(None)
+        with self._new_update:
+            self._new_update.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _deliver(self):
+        while True:
+            update = self._deliveries.get()
+            if update is None:
+                return
+            time.sleep(self.latency)
+            url, secret_token = self.webhook
+            request = Request(
+                url,
+                json.dumps(update).encode(),
+                {
+                    "Content-Type": "application/json",
+                    "X-Telegram-Bot-Api-Secret-Token": secret_token,
+                },
+            )
+            with urlopen(request, timeout=10) as response:
+                response.read()
+
+    def _get_updates(self, offset=0, limit=100, timeout=0, **_):
+        deadline = time.monotonic() + float(timeout)
+        with self._new_update:
+            while True:
+                self._updates = [u for u in self._updates if u["update_id"] >= int(offset or 0)]
+                left = deadline - time.monotonic()
+                if self._updates or left <= 0:
+                    return self._updates[: int(limit)]
+                self._new_update.wait(left)
+
+    def call(self, method, parameters):
+        """
+        :return: Result of a Bot API method.
+        """
+        if method == "getMe":
+            return BOT
+        if method == "getUpdates":
+            return self._get_updates(**parameters)
+        if method == "setWebhook":
+            self.webhook = (parameters["url"], parameters.get("secret_token", ""))
+            return True
+        if method == "deleteWebhook":
+            self.webhook = None
+            return True
+        if method == "sendMessage":
+            self.sent.put((time.perf_counter(), parameters))
+            return {
+                "message_id": 1,
+                "from": BOT,
+                "chat": {"id": int(parameters["chat_id"]), "type": "group", "title": "Chat"},
+                "date": int(time.time()),
+                "text": parameters["text"],
+            }
+        if method in ("answerCallbackQuery", "editMessageText"):
+            return True
+        raise KeyError(method)
+
+    def _request_handler(self):
+        api = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                parameters = json.loads(body) if body else {}
+                try:
+                    answer = {"ok": True, "result": api.call(self.path.split("/")[-1], parameters)}
+                except KeyError as e:
+                    answer = {
+                        "ok": False,
+                        "error_code": 404,
+                        "description": "Not Found: {}".format(e),
+                    }
+                time.sleep(api.latency)
+                data = json.dumps(answer).encode()
+                self.send_response(200 if answer["ok"] else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return RequestHandler
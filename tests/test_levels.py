@@ -0,0 +1,95 @@
+"""
+Levels from the threshold table against the loop they replace, on random users.
+"""
+import random
+
+
+import numpy as np
+import pytest
+
+
+from modules.community.levels import get_level, get_levels, MAX_LEVEL
+
+
+def old_needed_exp(level, karma):
+    if level == 0:
+        return 0
+    # Dirty hack
+    if level == 1:
+        return 5
+    return int((level ** 3.14) * (1 - (karma / (level ** 3.14))))
+
+
+def old_level(num_messages, karma, level=0):
+    while num_messages > old_needed_exp(level, karma):
+        level += 1
+    return level
+
+
+def random_user(rng):
+    """
+    :return: (num_messages, karma, level), mostly realistic, sometimes extreme.
+    """
+    num_messages = rng.choice(
+        [
+            rng.randint(0, 20),
+            rng.randint(0, 50_000),
+            rng.randint(0, 10 ** 7),
+            rng.randint(0, 10 ** 10),
+        ]
+    )
+    karma = rng.choice([0, rng.randint(-100, 100), rng.randint(-(10 ** 5), 10 ** 5)])
+    level = rng.choice([0, 1, 2, rng.randint(0, 60), rng.randint(0, MAX_LEVEL + 50)])
+    return num_messages, karma, level
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_get_level_matches_loop(seed):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        num_messages, karma, level = random_user(rng)
+        assert get_level(num_messages, karma, level) == old_level(num_messages, karma, level), (
+            num_messages,
+            karma,
+            level,
+        )
+
+
+@pytest.mark.parametrize(
+    "num_messages, karma",
+    [(0, 0), (5, 0), (6, 0), (8, 0), (9, 0), (0, -10), (3, 100), (10 ** 6, 10 ** 6), (10 ** 10, 0)],
+)
+def test_get_level_edges(num_messages, karma):
+    assert get_level(num_messages, karma) == old_level(num_messages, karma)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_get_levels_matches_loop(seed):
+    rng = random.Random(seed)
+    users = [random_user(rng)[:2] for _ in range(5000)]
+    num_messages, karma = (np.array(column, dtype=np.int64) for column in zip(*users))
+    expected = [old_level(n, k) for n, k in users]
+    assert get_levels(num_messages, karma).tolist() == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_get_levels_from_current_level(seed):
+    rng = random.Random(seed)
+    users = [random_user(rng) for _ in range(5000)] + [(3, 7, 2), (0, 0, 1), (10, 500, 3)]
+    num_messages, karma, levels = (np.array(column, dtype=np.int64) for column in zip(*users))
+    expected = [old_level(n, k, level) for n, k, level in users]
+    assert get_levels(num_messages, karma, levels).tolist() == expected
+
+
+def test_get_levels_never_lower():
+    """
+    Users who lost karma keep their level, as with `get_level` on each message.
+    """
+    num_messages, karma = np.array([100, 1000]), np.array([50, 900])
+    levels = get_levels(num_messages, karma)
+    assert (get_levels(num_messages, karma - 1000, levels) == levels).all()
+    assert (get_levels(num_messages, karma - 1000) < levels).all()
+
+
+def test_get_levels_empty():
+    assert get_levels(np.array([], dtype=np.int64), np.array([], dtype=np.int64)).tolist() == []
@@ -0,0 +1,122 @@
+"""
+PrefetchPool against a local stub of the API.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+
+import pytest
+
+
+from modules.spam.prefetch import PrefetchPool
+
+
+class StubAPI(BaseHTTPRequestHandler):
+    """
+    Answers with the next of `script`, the last one being repeated.
+    """
+
+    script = []
+    calls = 0
+
+    def do_GET(self):
+        cls = type(self)
+        kind = cls.script[min(cls.calls, len(cls.script) - 1)]
+        cls.calls += 1
+        if kind == "ok":
+            body = json.dumps([{"url": "https://cats/{}.jpg".format(cls.calls)}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif kind == "truncated":  # http.client.IncompleteRead on the client
+            self.send_response(200)
+            self.send_header("Content-Length", "100")
+            self.end_headers()
+            self.wfile.write(b'[{"url": ')
+        elif kind == "garbage":
+            self.send_response(200)
+            self.send_header("Content-Length", "4")
+            self.end_headers()
+            self.wfile.write(b"nope")
+        else:
+            self.send_error(500)
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message):
+        self.warnings.append(message)
+
+
+@pytest.fixture
+def api():
+    StubAPI.calls = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{}/".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_fills_up_to_size(api):
+    StubAPI.script = ["ok"]
+    pool = PrefetchPool(api, size=5, low=2)
+    assert wait_for(lambda: pool._urls.full())
+    assert pool.pop().startswith("https://cats/")
+
+
+def test_pop_refills_below_low(api):
+    StubAPI.script = ["ok"]
+    pool = PrefetchPool(api, size=4, low=3)
+    assert wait_for(lambda: pool._urls.full())
+    calls = StubAPI.calls
+    pool.pop()
+    pool.pop()
+    assert wait_for(lambda: pool._urls.full())
+    assert StubAPI.calls > calls
+
+
+def test_http_error_is_retried(api):
+    """
+    A real 500 from the API, that is logged and retried.
+    """
+    StubAPI.script = ["error", "error", "ok"]
+    logger = RecordingLogger()
+    pool = PrefetchPool(api, logger, size=2, low=1, max_backoff=1)
+    assert wait_for(lambda: pool._urls.full())
+    assert StubAPI.calls >= 3
+    assert any("HTTP Error 500" in message for message in logger.warnings)
+
+
+def test_empty_pool_pops_none(api):
+    StubAPI.script = ["error"]
+    pool = PrefetchPool(api, size=3, low=1)
+    assert pool.pop() is None
+
+
+@pytest.mark.parametrize("failure", ["truncated", "garbage", "error"])
+def test_survives_failures(api, failure):
+    """
+    A failing call is retried, whatever it raises, instead of ending the refilling thread.
+    """
+    StubAPI.script = [failure, "ok"]
+    pool = PrefetchPool(api, size=3, low=1, max_backoff=1)
+    assert wait_for(lambda: pool._urls.full())
+    assert StubAPI.calls >= 2
@@ -0,0 +1,102 @@
+"""
+ProcessPool on real worker processes, without Telegram.
+"""
+import os
+import queue
+import time
+
+
+import pytest
+
+
+from modules.base import cpu_bound, ProcessPool
+
+
+def pid():
+    return os.getpid()
+
+
+def square(x):
+    return x * x
+
+
+def fail():
+    raise ValueError("nope")
+
+
+@cpu_bound(timeout=0.5)
+def hang():
+    time.sleep(60)
+
+
+def die():
+    os._exit(1)
+
+
+def unpicklable():
+    return lambda: None
+
+
+@pytest.fixture
+def pool():
+    pool = ProcessPool(workers=1, queue_size=4, timeout=10)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def call(pool, func, *args):
+    """
+    :return: (True, result) or (False, exception), once the task is done.
+    """
+    results = queue.Queue()
+    assert pool.submit(
+        func, args, lambda value: results.put((True, value)), lambda e: results.put((False, e))
+    )
+    return results.get(timeout=60)
+
+
+def test_result(pool):
+    assert call(pool, square, 7) == (True, 49)
+
+
+def test_exception(pool):
+    success, error = call(pool, fail)
+    assert not success and isinstance(error, ValueError)
+
+
+def test_same_worker_between_tasks(pool):
+    assert call(pool, pid) == call(pool, pid)
+    assert call(pool, pid)[1] != os.getpid()
+
+
+def test_timeout_kills_and_respawns(pool):
+    _, before = call(pool, pid)
+    start = time.monotonic()
+    success, error = call(pool, hang)
+    assert not success and isinstance(error, TimeoutError)
+    assert time.monotonic() - start < 30
+    _, after = call(pool, pid)
+    assert after != before
+    assert call(pool, square, 3) == (True, 9)
+
+
+def test_dead_worker_respawns(pool):
+    _, before = call(pool, pid)
+    success, _ = call(pool, die)
+    assert not success
+    _, after = call(pool, pid)
+    assert after != before
+
+
+def test_unpicklable_result(pool):
+    success, error = call(pool, unpicklable)
+    assert not success and isinstance(error, RuntimeError)
+    assert call(pool, square, 2) == (True, 4)
+
+
+def test_full_queue():
+    pool = ProcessPool(workers=1, queue_size=2)  # Not started, so nothing takes the tasks
+    assert pool.submit(square, (1,), print, print)
+    assert pool.submit(square, (2,), print, print)
+    assert not pool.submit(square, (3,), print, print)
@@ -0,0 +1,154 @@
+"""
+Webhook mode end to end: recorded updates POSTed to the local listener, answered through a stub
+Bot API.
+"""
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import json
+import os
+import queue
+import socket
+
+
+from telegram.ext import CallbackQueryHandler, CommandHandler, Filters, MessageHandler, Updater
+import pytest
+
+
+from modules.webhook import WebhookServer
+from tests.stub_bot_api import StubBotAPI, TOKEN
+
+
+SECRET = "s3cret-token"
+UPDATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "updates.json")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def api():
+    api = StubBotAPI()
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def webhook(api):
+    updater = Updater(TOKEN, base_url=api.base_url)
+    dispatcher = updater.dispatcher
+    dispatcher.add_handler(
+        CommandHandler("ping", lambda update, context: update.message.reply_text("pong"))
+    )
+    dispatcher.add_handler(
+        MessageHandler(
+            Filters.update.message & Filters.text,
+            lambda update, context: update.message.reply_text("got " + update.message.text),
+        )
+    )
+    dispatcher.add_handler(
+        MessageHandler(
+            Filters.update.edited_message,
+            lambda update, context: context.bot.send_message(
+                update.effective_chat.id, "edited " + update.edited_message.text
+            ),
+        )
+    )
+    dispatcher.add_handler(
+        CallbackQueryHandler(
+            lambda update, context: context.bot.send_message(
+                update.effective_chat.id, "clicked " + update.callback_query.data
+            )
+        )
+    )
+
+    port = free_port()
+    server = WebhookServer(
+        dispatcher, "http://127.0.0.1:{}/hook".format(port), SECRET, "127.0.0.1", port
+    )
+    server.start()
+    yield server
+    server.stop()
+
+
+def post(server, body, secret=SECRET, path=None):
+    """
+    :return: HTTP status code of the answer of the webhook.
+    """
+    request = Request(
+        server.url if path is None else server.url.replace(server.path, path),
+        body if isinstance(body, bytes) else json.dumps(body).encode(),
+        {"Content-Type": "application/json", WebhookServer.SECRET_HEADER: secret},
+    )
+    try:
+        with urlopen(request, timeout=5) as response:
+            return response.status
+    except HTTPError as e:
+        return e.code
+
+
+def test_sets_webhook(api, webhook):
+    assert api.webhook == (webhook.url, SECRET)
+
+
+def test_recorded_updates(api, webhook):
+    with open(UPDATES) as file:
+        updates = json.load(file)
+    for update in updates:
+        assert post(webhook, update) == 200
+
+    texts = []
+    for _ in updates:
+        _, parameters = api.sent.get(timeout=5)
+        assert int(parameters["chat_id"]) == -1001234567890
+        texts.append(parameters["text"])
+    assert texts == ["pong", "got +1", "edited +1 !", "clicked karma:10:10:12:1001"]
+
+
+def test_pushed_by_telegram(api, webhook):
+    with open(UPDATES) as file:
+        api.push(json.load(file)[0])
+    _, parameters = api.sent.get(timeout=5)
+    assert parameters["text"] == "pong"
+
+
+@pytest.mark.parametrize(
+    "body, secret, path, status",
+    [
+        (b"{}", "wrong", None, 403),
+        (b"{}", "", None, 403),
+        (b"{}", SECRET, "/other", 404),
+        (b"not json", SECRET, None, 400),
+        (b"null", SECRET, None, 400),
+        (b"[]", SECRET, None, 400),
+        (b"42", SECRET, None, 400),
+    ],
+)
+def test_rejected(api, webhook, body, secret, path, status):
+    assert post(webhook, body, secret, path) == status
+    with pytest.raises(queue.Empty):
+        api.sent.get(timeout=0.2)
+
+
+def test_keeps_dispatching_after_bad_bodies(api, webhook):
+    for body in (b"null", b"[]", b"not json"):
+        assert post(webhook, body) == 400
+    with open(UPDATES) as file:
+        assert post(webhook, json.load(file)[0]) == 200
+    _, parameters = api.sent.get(timeout=5)
+    assert parameters["text"] == "pong"
+
+
+def test_full_queue(api):
+    updater = Updater(TOKEN, base_url=api.base_url)
+    server = WebhookServer(
+        updater.dispatcher, "http://127.0.0.1/hook", SECRET, port=0, queue_size=1
+    )  # Not started, so nothing empties the queue
+    headers = {WebhookServer.SECRET_HEADER: SECRET}
+    with open(UPDATES) as file:
+        first, second = (json.dumps(update).encode() for update in json.load(file)[:2])
+    assert server.receive("/hook", headers, first) == 200
+    assert server.receive("/hook", headers, second) == 503
+    server._server.server_close()
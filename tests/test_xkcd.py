@@ -0,0 +1,103 @@
+"""
+XkcdIndex built offline from the dump of tests/data/xkcd.json.
+"""
+from urllib.error import HTTPError
+import json
+import os
+
+
+import pytest
+
+
+from modules.spam.xkcd import XkcdIndex
+
+
+DUMP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "xkcd.json")
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = XkcdIndex(str(tmp_path / "xkcd.db"), interval=None)
+    index.load_dump(DUMP)
+    return index
+
+
+def test_lookups(index):
+    assert index.latest() == 1172
+    assert index.get(303).title == "Compiling"
+    assert index.get(404) is None
+    for _ in range(20):
+        assert index.random().num in (149, 303, 327, 353, 386, 927, 1053, 1172)
+
+
+def test_empty(tmp_path):
+    index = XkcdIndex(str(tmp_path / "xkcd.db"), interval=None)
+    assert index.latest() == 0
+    assert index.random() is None
+    assert index.search("python") == []
+
+
+@pytest.mark.parametrize(
+    "words, first",
+    [
+        ("compiling", 303),
+        ("compile", 303),  # Stemming
+        ("Bobby Tables", 327),
+        ("sanitize database inputs", 327),
+        ("import antigravity", 353),
+        ("someone is wrong on the internet", 386),
+        ("competing standards", 927),
+        ("supervolcano", 1053),
+        ("spacebar", 1172),
+        ("sudo sandwich", 149),
+    ],
+)
+def test_search(index, words, first):
+    assert index.search(words)[0].num == first
+
+
+def test_search_special_characters(index):
+    assert index.search("") == []
+    assert index.search('"DROP TABLE"') != []
+    assert index.search("( ) * : ^") == []
+    assert [comic.num for comic in index.search("NEAR spacebar")] == [1172]  # Not FTS5 syntax
+
+
+def test_search_limit(index):
+    assert len(index.search("the", limit=2)) == 2
+
+
+def test_add_replaces(index):
+    index.add([{"num": 303, "title": "Recompiling", "alt": "", "transcript": ""}])
+    assert index.get(303).title == "Recompiling"
+    assert [comic.num for comic in index.search("recompiling")] == [303]
+    assert [comic.num for comic in index.search("slacking")] == []
+
+
+def test_sync_keeps_partial_batch(index):
+    """
+    Comics fetched before a failure are written, and the next sync goes on from there.
+    """
+    with open(DUMP) as file:
+        template = json.load(file)[0]
+
+    def fetch(num=None):
+        if num is None:
+            return dict(template, num=1180)
+        if num == 1175:
+            raise HTTPError("https://xkcd.com/1175/", 404, "Not Found", None, None)
+        if num == 1177 and failing:
+            raise OSError("Connection reset by peer")
+        return dict(template, num=num, title="Comic {}".format(num))
+
+    index._fetch = fetch
+    failing = True
+    with pytest.raises(OSError):
+        index.sync(batch=50)
+    assert index.latest() == 1176
+    assert index.get(1175) is None
+    assert index.get(1173).title == "Comic 1173"
+
+    failing = False
+    assert index.sync(batch=2) == 4
+    assert index.latest() == 1180